@@ -1,4 +1,5 @@
 from django.contrib import admin
+from .assignment import parse_hours
 from .models import *
 
 class CouriersAdmin(admin.ModelAdmin):
@@ -9,6 +10,11 @@ class CouriersAdmin(admin.ModelAdmin):
     list_editable = ['courier_type', 'regions', 'working_hours']
     list_filter = fields
 
+    def save_model(self, request, obj, form, change):
+        obj.working_minutes = parse_hours(obj.working_hours)
+        obj.working_span = hours_span(obj.working_minutes)
+        super().save_model(request, obj, form, change)
+
 class OrdersAdmin(admin.ModelAdmin):
     fields = ['weight', 'regions', 'cost', 'complete_time', 'courier']
 
@@ -0,0 +1,253 @@
+import heapq
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from .feasibility import FeasibilityIndex
+except ImportError:
+    # без numpy используется только построчная проверка
+    FeasibilityIndex = None
+
+# Движок распределения заказов по курьерам. Не зависит от Django:
+# на вход получает простые записи курьеров и заказов, на выходе отдаёт назначения.
+
+# Ограничения по типу курьера:
+# максимальное количество заказов, суммарный вес, количество регионов,
+# время на первый заказ в регионе и на каждый последующий (в минутах)
+CourierLimits = namedtuple('CourierLimits', [
+    'max_orders_amount', 'max_carriable_weight', 'max_regions_amount',
+    'first_order_in_region_time', 'subsequent_orders_in_region_time',
+])
+
+COURIER_LIMITS = {
+    'FOOT': CourierLimits(2, 10, 1, 25, 10),
+    'BIKE': CourierLimits(4, 20, 2, 12, 8),
+    'AUTO': CourierLimits(7, 40, 4, 8, 4),
+}
+
+# Порядок, в котором курьеры разных типов получают заказы
+COURIER_TYPES_ORDER = ('FOOT', 'BIKE', 'AUTO')
+
+# Начиная с этого количества заказов кандидаты отбираются векторизованно (нужен numpy)
+VECTORIZE_MIN_ORDERS = 2000
+
+# working_hours и delivery_hours - списки интервалов (начало, конец) в минутах от начала суток.
+# pending_* - недоставленные заказы, которые уже числятся за курьером.
+CourierRecord = namedtuple('CourierRecord', [
+    'id', 'courier_type', 'regions', 'working_hours',
+    'pending_count', 'pending_weight', 'pending_regions',
+])
+OrderRecord = namedtuple('OrderRecord', ['id', 'weight', 'regions', 'delivery_hours', 'cost'])
+Assignment = namedtuple('Assignment', ['courier_id', 'order_id', 'cost'])
+
+
+def parse_time(value):
+    # '10:30' -> 630
+    hours, minutes = value.split(':')
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f'Invalid time: {value}')
+    return hours * 60 + minutes
+
+
+def parse_hours(intervals):
+    # ['10:00-11:00'] -> [[600, 660]]
+    hours = []
+    for interval in intervals:
+        start, end = interval.split('-')
+        hours.append([parse_time(start), parse_time(end)])
+    return hours
+
+
+def overlap(working_hours, delivery_hours, limit):
+    for delivery_start, delivery_end in delivery_hours:
+        for working_start, working_end in working_hours:
+            if working_start <= delivery_start <= delivery_end <= working_end:
+                return True
+            elif working_start <= delivery_start <= working_end \
+                    and working_end - delivery_start >= limit:
+                return True
+            elif delivery_start <= working_start <= delivery_end \
+                    and delivery_end - working_start >= limit:
+                return True
+            elif delivery_start <= working_end <= delivery_end \
+                    and delivery_end - working_end >= limit:
+                return True
+    return False
+
+
+class CourierState:
+    # Текущая загрузка курьера: количество, вес и регионы его недоставленных заказов
+
+    def __init__(self, courier):
+        self.id = courier.id
+        self.courier_type = courier.courier_type
+        self.limits = COURIER_LIMITS[courier.courier_type]
+        self.regions = set(courier.regions)
+        self.working_hours = courier.working_hours
+        self.pending_count = courier.pending_count
+        self.pending_weight = courier.pending_weight
+        self.pending_regions = set(courier.pending_regions)
+        self.assigned = []
+
+    @property
+    def is_full(self):
+        return self.pending_count >= self.limits.max_orders_amount
+
+    def get_limit(self, order):
+        # Проверяет, может ли курьер взять ещё один заказ по лимиту на количество заказов,
+        # суммарный вес заказов и количество регионов. Возвращает время, которое понадобится
+        # на выполнение имеющихся заказов плюс этого заказа, и коэффициент стоимости
+        limits = self.limits
+        if self.pending_count >= limits.max_orders_amount \
+                or self.pending_weight + order.weight > limits.max_carriable_weight \
+                or order.regions not in self.regions:
+            return None, None
+
+        new_region = order.regions not in self.pending_regions
+        regions_amount = len(self.pending_regions) + new_region
+        if regions_amount > limits.max_regions_amount:
+            return None, None
+
+        if new_region:
+            limit = regions_amount * limits.first_order_in_region_time \
+                + (self.pending_count - regions_amount + 1) * limits.subsequent_orders_in_region_time
+            coefficient = 1
+        else:
+            limit = regions_amount * limits.first_order_in_region_time \
+                + (self.pending_count - regions_amount) * limits.subsequent_orders_in_region_time
+            coefficient = 0.8
+        return limit, coefficient
+
+    def take(self, order, coefficient):
+        self.pending_count += 1
+        self.pending_weight += order.weight
+        self.pending_regions.add(order.regions)
+        assignment = Assignment(self.id, order.id, int(order.cost * coefficient))
+        self.assigned.append(assignment)
+        return assignment
+
+
+def sort_couriers(couriers):
+    # Сначала пешие курьеры, затем велокурьеры, затем автокурьеры; внутри типа - по id
+    return sorted(couriers, key=lambda c: (COURIER_TYPES_ORDER.index(c.courier_type), c.id))
+
+
+def sort_orders(orders):
+    # Заказы с самыми ранними интервалами доставки идут первыми, при равенстве - по id
+    return sorted(orders, key=lambda order: (order.delivery_hours, order.id))
+
+
+class RegionIndex:
+    # Построчный отбор кандидатов: заказы регионов курьера в порядке сортировки
+
+    def __init__(self, orders):
+        # индекс: регион -> позиции заказов этого региона в отсортированном списке
+        self.by_region = {}
+        for position, order in enumerate(orders):
+            self.by_region.setdefault(order.regions, []).append(position)
+
+        # самое раннее начало интервала доставки заказа: если все границы рабочих интервалов
+        # курьера лежат раньше, заказ ему не подходит ни при каком лимите
+        self.earliest_start = [
+            min((start for start, end in order.delivery_hours), default=None) for order in orders
+        ]
+
+    def assigned_mask(self):
+        return [False] * len(self.earliest_start)
+
+    def candidates(self, state, assigned):
+        latest_end = max(max(interval) for interval in state.working_hours)
+        positions = heapq.merge(*(self.by_region[region] for region in state.regions if region in self.by_region))
+        for position in positions:
+            if assigned[position] or self.earliest_start[position] is None \
+                    or self.earliest_start[position] > latest_end:
+                continue
+            yield position
+
+
+def assign(couriers, orders, vectorize=None):
+    # Жадное распределение: курьеры по очереди забирают подходящие заказы
+    # в порядке возрастания интервалов доставки.
+    # Возвращает состояния курьеров, в каждом из которых лежит список назначений.
+    orders = sort_orders(orders)
+    states = [CourierState(courier) for courier in sort_couriers(couriers)]
+
+    if vectorize is None:
+        vectorize = FeasibilityIndex is not None and len(orders) >= VECTORIZE_MIN_ORDERS
+    index = FeasibilityIndex(orders) if vectorize else RegionIndex(orders)
+    assigned = index.assigned_mask()
+
+    for state in states:
+        if state.is_full or not state.working_hours:
+            continue
+
+        for position in index.candidates(state, assigned):
+            order = orders[position]
+            limit, coefficient = state.get_limit(order)
+            if limit and overlap(state.working_hours, order.delivery_hours, limit):
+                state.take(order, coefficient)
+                assigned[position] = True
+                if state.is_full:
+                    break
+
+    return states
+
+
+def split_by_regions(couriers, orders):
+    # Делит задачу на независимые части: регионы, которые обслуживает хотя бы один 
+    # общий курьер, попадают в одну компоненту. Курьеры разных компонент не претендуют 
+    # на одни и те же заказы, поэтому каждую можно распределять отдельно.
+    # Компоненты без заказов или без курьеров отбрасываются
+    parent = {}
+
+    def find(region):
+        root = parent.setdefault(region, region)
+        while root != parent[root]:
+            parent[root] = parent[parent[root]]
+            root = parent[root]
+        return root
+
+    for courier in couriers:
+        regions = list(courier.regions)
+        for region in regions:
+            parent[find(region)] = find(regions[0])
+
+    components = {}
+    for courier in couriers:
+        if courier.regions:
+            components.setdefault(find(next(iter(courier.regions))), ([], []))[0].append(courier)
+    for order in orders:
+        if order.regions in parent:
+            components.setdefault(find(order.regions), ([], []))[1].append(order)
+    return [component for component in components.values() if component[0] and component[1]]
+
+
+def _assign_part(part):
+    couriers, orders = part
+    return assign(couriers, orders)
+
+
+def assign_parallel(couriers, orders, workers):
+    # То же, что assign, но компоненты регионов распределяются в workers процессах.
+    # Внутри компоненты порядок курьеров и заказов тот же, что и при общем распределении, 
+    # поэтому результат совпадает с последовательным запуском
+    components = split_by_regions(couriers, orders)
+    if workers <= 1 or len(components) <= 1:
+        return assign(couriers, orders)
+
+    # крупные компоненты раскладываются первыми - в наименее загруженную часть
+    parts = [([], []) for _ in range(min(workers, len(components)))]
+    loads = [(0, index) for index in range(len(parts))]
+    for component_couriers, component_orders in sorted(components, key=lambda c: -len(c[1])):
+        load, index = heapq.heappop(loads)
+        parts[index][0].extend(component_couriers)
+        parts[index][1].extend(component_orders)
+        heapq.heappush(loads, (load + len(component_orders), index))
+
+    # spawn: рабочие процессы не наследуют соединения с БД и потоки веб-сервера
+    with ProcessPoolExecutor(len(parts), mp_context=multiprocessing.get_context('spawn')) as executor:
+        states = {state.id: state for result in executor.map(_assign_part, parts) for state in result}
+
+    return [states.get(courier.id) or CourierState(courier) for courier in sort_couriers(couriers)]
@@ -0,0 +1,219 @@
+import contextlib
+import datetime
+import json
+import platform
+import random
+import statistics
+import time
+import tracemalloc
+from django.conf import settings
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+from .models import Couriers, Orders
+from .renderers import FastJSONRenderer
+from .seeding import DEFAULT_TYPES, flush, make_courier, make_order, seed
+from .serializers import COURIERS_READ, ORDERS_READ, CouriersSerializer, OrdersSerializer
+from .views import CouriersViewSet, OrdersViewSet
+
+# Бенчмарк эндпоинтов на синтетических данных: для каждого размера база очищается
+# и заполняется заново, затем замеряются время, количество запросов и (отдельным прогоном) пик памяти
+
+
+def as_view(viewset, actions):
+    # троттлинг в бенчмарке не нужен
+    return viewset.as_view(actions, throttle_classes=[])
+
+
+def render(response):
+    if hasattr(response, 'render'):
+        response.render()
+    return response
+
+
+def peak_memory(call, database=True):
+    # Отдельный прогон под tracemalloc: он замедляет каждое выделение памяти и исказил бы время.
+    # Изменения в БД откатываются, чтобы замеряемые после него вызовы работали с теми же данными
+    tracemalloc.start()
+    try:
+        with transaction.atomic() if database else contextlib.nullcontext():
+            render(call())
+            if database:
+                transaction.set_rollback(True)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def measure(endpoint, call, repeat=1, database=True):
+    peak = peak_memory(call, database)
+    walls = []
+    for _ in range(repeat):
+        with (CaptureQueriesContext(connection) if database else contextlib.nullcontext([])) as queries:
+            started = time.perf_counter()
+            response = render(call())
+            walls.append((time.perf_counter() - started) * 1000)
+
+    return {
+        'endpoint': endpoint,
+        'status': getattr(response, 'status_code', None),
+        'wall_ms': round(statistics.median(walls), 3),
+        'wall_ms_min': round(min(walls), 3),
+        'queries': len(queries),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'repeat': repeat,
+    }
+
+
+def run_size(size, couriers_ratio=0.1, history_ratio=1.0, regions=20, repeat=5, random_seed=0):
+    factory = APIRequestFactory()
+    rng = random.Random(random_seed)
+    today = timezone.localdate()
+    couriers = max(1, int(size * couriers_ratio))
+    results = []
+
+    flush()
+    results.append(measure('seed', lambda: seed(
+        couriers, size, regions=regions, history=int(size * history_ratio), random_seed=random_seed
+    )))
+
+    ingest = [
+        {'weight': order.weight, 'regions': order.regions,
+         'delivery_hours': order.delivery_hours, 'cost': order.cost}
+        for order in (make_order(rng, regions) for _ in range(min(size, 1000)))
+    ]
+    results.append(measure('POST /orders/bulk', lambda: as_view(OrdersViewSet, {'post': 'bulk_ingest'})(
+        factory.post('/orders/bulk/', {'content': {'orders': ingest}}, format='json')
+    )))
+
+    results.append(measure('POST /orders/assign', lambda: as_view(OrdersViewSet, {'post': 'assign_orders'})(
+        factory.post('/orders/assign/')
+    )))
+
+    assigned = list(Orders.objects.filter(
+        assignment_date=today, complete_time__isnull=True
+    ).order_by('id').values_list('courier_id', 'id')[:100])
+    courier_id = assigned[0][0] if assigned else Couriers.objects.values_list('id', flat=True).first()
+    start_date = (today - datetime.timedelta(days=30)).isoformat()
+    end_date = (today + datetime.timedelta(days=1)).isoformat()
+
+    reads = [
+        ('GET /couriers/assignments', CouriersViewSet, 'get_assigned_orders',
+         '/couriers/assignments/', {'date': today.isoformat()}, {}),
+        ('GET /couriers/assignments?courier_id', CouriersViewSet, 'get_assigned_orders',
+         '/couriers/assignments/', {'date': today.isoformat(), 'courier_id': courier_id}, {}),
+        ('GET /couriers/meta-info/{id}', CouriersViewSet, 'get_meta_info',
+         f'/couriers/meta-info/{courier_id}/', {'startDate': start_date, 'endDate': end_date},
+         {'courier_id': courier_id}),
+        ('GET /couriers/meta-info', CouriersViewSet, 'get_meta_info_batch',
+         '/couriers/meta-info/', {'startDate': start_date, 'endDate': end_date, 'limit': 100}, {}),
+        ('GET /orders?offset', OrdersViewSet, 'list',
+         '/orders/', {'limit': 100, 'offset': size // 2}, {}),
+        ('GET /orders?after', OrdersViewSet, 'list',
+         '/orders/', {'limit': 100, 'after': size // 2}, {}),
+    ]
+    for endpoint, viewset, action, path, params, kwargs in reads:
+        view = as_view(viewset, {'get': action})
+        results.append(measure(
+            endpoint, lambda: view(factory.get(path, params), **kwargs), repeat=repeat
+        ))
+
+    complete_time = timezone.now().isoformat()
+    complete_info = [
+        {'courier_id': courier_id, 'order_id': order_id, 'complete_time': complete_time}
+        for courier_id, order_id in assigned
+    ]
+    results.append(measure('POST /orders/complete', lambda: as_view(OrdersViewSet, {'post': 'complete_order'})(
+        factory.post('/orders/complete/', {'content': {'complete_info': complete_info}}, format='json')
+    )))
+
+    for result in results:
+        result['size'] = size
+    return results
+
+
+def run_serialization(size, repeat=5, regions=20, random_seed=0):
+    # Сериализация size строк без БД: ModelSerializer + JSONRenderer против
+    # FastReadSerializer + FastJSONRenderer. Строки быстрого пути - такие же словари,
+    # как из .values(); вывод обоих путей обязан совпадать побайтно
+    rng = random.Random(random_seed)
+    couriers = [make_courier(rng, regions, DEFAULT_TYPES) for _ in range(size)]
+    orders = [make_order(rng, regions) for _ in range(size)]
+    for pk, (courier, order) in enumerate(zip(couriers, orders), 1):
+        courier.pk = order.pk = pk
+
+    results = []
+    for name, objects, serializer_class, read_serializer in (
+            ('couriers', couriers, CouriersSerializer, COURIERS_READ),
+            ('orders', orders, OrdersSerializer, ORDERS_READ)):
+        rows = [{field: getattr(obj, field) for field in read_serializer.fields} for obj in objects]
+
+        def serializer_path():
+            return JSONRenderer().render({name: serializer_class(objects, many=True).data})
+
+        def fast_path():
+            # копии строк: to_representation меняет строки на месте, как и строки .values()
+            return FastJSONRenderer().render(
+                {name: read_serializer.to_representation([dict(row) for row in rows])}
+            )
+
+        if serializer_path() != fast_path():
+            raise AssertionError(f'Fast {name} output differs from the serializer output')
+
+        for endpoint, call in ((f'serialize {name} (ModelSerializer)', serializer_path),
+                               (f'serialize {name} (fast)', fast_path)):
+            result = measure(endpoint, call, repeat=repeat, database=False)
+            result['size'] = size
+            results.append(result)
+    return results
+
+
+def run(sizes, serialization=False, **options):
+    # serialization - только сериализация ответов, без БД.
+    # Запросы APIRequestFactory приходят на хост testserver: вне тестов его нет в ALLOWED_HOSTS,
+    # а ссылки пагинации строятся по хосту запроса
+    results = []
+    with override_settings(ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ['testserver']):
+        for size in sizes:
+            if serialization:
+                results += run_serialization(
+                    size, repeat=options.get('repeat', 5), regions=options.get('regions', 20),
+                    random_seed=options.get('random_seed', 0)
+                )
+            else:
+                results += run_size(size, **options)
+    return {
+        'meta': {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'database': None if serialization else connection.vendor,
+            'sizes': list(sizes),
+            'options': options,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current):
+    # строки 'размер эндпоинт: было -> стало' по времени и количеству запросов
+    previous = {(r['size'], r['endpoint']): r for r in baseline['results']}
+    lines = []
+    for result in current['results']:
+        old = previous.get((result['size'], result['endpoint']))
+        if old is None:
+            continue
+        ratio = result['wall_ms'] / old['wall_ms'] if old['wall_ms'] else float('inf')
+        lines.append(
+            f'{result["size"]:>8} {result["endpoint"]:<40} '
+            f'{old["wall_ms"]:>10.1f} -> {result["wall_ms"]:>10.1f} ms (x{ratio:.2f}), '
+            f'queries {old["queries"]} -> {result["queries"]}'
+        )
+    return lines
+
+
+def dump(results, path):
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2)
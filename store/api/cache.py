@@ -0,0 +1,88 @@
+import time
+from django.conf import settings
+from django.core.cache import caches
+from .routers import use_replica
+
+# Кэш ответов GET /couriers/{id}, GET /orders/{id} и GET /couriers/assignments.
+# Бэкенд задаётся алиасом settings.API_CACHE_ALIAS в CACHES (по умолчанию LocMemCache
+# с вытеснением давно не использованных записей). Записи сбрасываются там, где меняются
+# строки, из которых они построены, - сменой версии, которая входит в ключ записи:
+#   order:{id} - версия заказа меняется при его распределении (меняется стоимость),
+#   общее поколение заказов - при переносе секций в архив (заказ пропадает из api_orders);
+#   assignments:{дата} - версия даты меняется при распределении заказов на эту дату.
+# Версия читается до построения записи: запрос, прочитавший строку до изменения,
+# сохранит её под старой версией, и новые запросы её не увидят (удаление ключа
+# не защищает от такой перезаписи).
+# Новые курьеры и заказы ответы не меняют: в них только курьеры с назначенными заказами,
+# а ?courier_id= неизвестного курьера кэшируется как запрос без courier_id.
+# Завершение заказа меняет только complete_time, которого нет в кэшируемых ответах.
+# LocMemCache у каждого процесса свой: при нескольких процессах нужен общий бэкенд
+# (FileBasedCache в общем каталоге, memcached, redis).
+# Записи строятся чтением с основной базы: отстающая реплика после сброса версии
+# сохранила бы под новым ключом данные до изменения
+
+ORDERS_GENERATION_KEY = 'orders:generation'
+
+
+def api_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def cached(key, build):
+    cache = api_cache()
+    value = cache.get(key)
+    if value is None:
+        token = use_replica.set(False)
+        try:
+            value = build()
+        finally:
+            use_replica.reset(token)
+        cache.set(key, value)
+    return value
+
+
+def courier_key(pk):
+    return f'courier:{pk}'
+
+
+def order_key(pk):
+    generation, version = _versions([ORDERS_GENERATION_KEY, _order_version_key(pk)])
+    return f'order:{pk}:{generation}.{version}'
+
+
+def _order_version_key(pk):
+    return f'order:version:{pk}'
+
+
+def _version_key(assignment_date):
+    return f'assignments:version:{assignment_date}'
+
+
+def _versions(keys):
+    # Версия - время создания в наносекундах, а не счётчик: если ключ версии вытеснен,
+    # новая версия не совпадёт ни с одной из прежних
+    cache = api_cache()
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+    return [versions.get(key) or missing[key] for key in keys]
+
+
+def assignments_key(assignment_date, courier_id, limit, after):
+    version = _versions([_version_key(assignment_date)])[0]
+    return f'assignments:{assignment_date}:{version}:{courier_id}:{limit}:{after}'
+
+
+def invalidate_orders(order_ids):
+    version = time.time_ns()
+    api_cache().set_many({_order_version_key(pk): version for pk in order_ids}, timeout=None)
+
+
+def invalidate_archived_orders():
+    # архивируется целая секция: сбрасываются записи всех заказов
+    api_cache().set(ORDERS_GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+def invalidate_assignments(assignment_date):
+    api_cache().set(_version_key(assignment_date), time.time_ns(), timeout=None)
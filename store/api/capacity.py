@@ -0,0 +1,72 @@
+from itertools import groupby
+from operator import itemgetter
+from django.db.models import Q
+from django.utils import timezone
+from .assignment import COURIER_LIMITS
+from .ingest import batches
+from .models import Couriers, Orders
+
+# Счётчики недоставленных заказов курьеров (pending_count, pending_weight, pending_regions).
+# Все изменения идут под блокировкой строк курьеров (select_for_update) внутри транзакции
+
+CAPACITY_FIELDS = ['pending_count', 'pending_weight', 'pending_regions']
+VERSION_FIELDS = ['assignment_version', 'assignments_updated_at']
+
+
+def eligible_couriers():
+    # курьеры, которые по лимиту своего типа могут взять ещё хотя бы один заказ
+    eligible = Q()
+    for courier_type, limits in COURIER_LIMITS.items():
+        eligible |= Q(courier_type=courier_type, pending_count__lt=limits.max_orders_amount)
+    return Couriers.objects.filter(eligible)
+
+
+def lock_couriers(courier_ids):
+    # блокировка всегда в порядке id, чтобы параллельные транзакции не взаимоблокировались
+    return Couriers.objects.select_for_update().filter(pk__in=courier_ids).order_by('id').in_bulk()
+
+
+def take_order(courier, weight, regions):
+    courier.pending_count += 1
+    courier.pending_weight += weight
+    courier.pending_regions.append(regions)
+
+
+def release_order(courier, weight, regions):
+    courier.pending_count = max(courier.pending_count - 1, 0)
+    courier.pending_weight -= weight
+    if regions in courier.pending_regions:
+        courier.pending_regions.remove(regions)
+    if not courier.pending_count:
+        courier.pending_weight = 0
+        courier.pending_regions = []
+
+
+def touch_assignments(courier):
+    # назначенные курьеру заказы изменились: новая версия для ETag
+    courier.assignment_version += 1
+    courier.assignments_updated_at = timezone.now()
+
+
+def rebuild_capacity(batch_size=2000):
+    # Пересчитывает счётчики всех курьеров по таблице заказов.
+    # Вес суммируется в порядке id заказов, как при распределении
+    Couriers.objects.update(pending_count=0, pending_weight=0, pending_regions=[])
+
+    pending = Orders.objects.filter(
+        courier__isnull=False, complete_time__isnull=True
+    ).order_by('courier_id', 'id').values_list('courier_id', 'weight', 'regions')
+
+    updated = 0
+    for batch in batches(_pending_couriers(pending, batch_size), batch_size):
+        Couriers.objects.bulk_update(batch, CAPACITY_FIELDS)
+        updated += len(batch)
+    return updated
+
+
+def _pending_couriers(pending, batch_size):
+    for courier_id, orders in groupby(pending.iterator(chunk_size=batch_size), key=itemgetter(0)):
+        courier = Couriers(pk=courier_id, pending_count=0, pending_weight=0, pending_regions=[])
+        for _, weight, regions in orders:
+            take_order(courier, weight, regions)
+        yield courier
@@ -0,0 +1,82 @@
+import csv
+import datetime
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from .ingest import batches
+from .models import Couriers, Orders
+
+# Потоковая выгрузка заказов и курьеров в CSV или NDJSON: строки читаются через
+# values_list().iterator() серверным курсором и отдаются пачками, поэтому память
+# не зависит от размера таблицы
+
+EXPORT_FIELDS = {
+    'orders': ('id', 'weight', 'regions', 'delivery_hours', 'cost',
+               'courier_id', 'assignment_date', 'complete_time'),
+    'couriers': ('id', 'courier_type', 'regions', 'working_hours', 'pending_count'),
+}
+EXPORT_MODELS = {'orders': Orders, 'couriers': Couriers}
+# статус заказа: выполнен, распределён и не выполнен, не распределён
+ORDER_STATUSES = ('completed', 'pending', 'unassigned')
+EXPORT_CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+
+
+def export_queryset(name, start_date=None, end_date=None, courier_ids=None, status=None):
+    # start_date / end_date - даты распределения заказа включительно ('YYYY-MM-DD'),
+    # courier_ids - заказы этих курьеров / эти курьеры, status - один из ORDER_STATUSES.
+    # Даты и статус есть только у заказов. Некорректный фильтр - ValueError
+    queryset = EXPORT_MODELS[name].objects.order_by('id')
+
+    if name == 'couriers':
+        if start_date or end_date or status:
+            raise ValueError('Couriers can be filtered only by courier')
+        if courier_ids:
+            queryset = queryset.filter(pk__in=courier_ids)
+        return queryset.values_list(*EXPORT_FIELDS[name])
+
+    if start_date:
+        queryset = queryset.filter(assignment_date__gte=datetime.date.fromisoformat(start_date))
+    if end_date:
+        queryset = queryset.filter(assignment_date__lte=datetime.date.fromisoformat(end_date))
+    if courier_ids:
+        queryset = queryset.filter(courier_id__in=courier_ids)
+    if status == 'completed':
+        queryset = queryset.filter(complete_time__isnull=False)
+    elif status == 'pending':
+        queryset = queryset.filter(courier__isnull=False, complete_time__isnull=True)
+    elif status == 'unassigned':
+        queryset = queryset.filter(courier__isnull=True)
+    elif status:
+        raise ValueError(f'Status must be one of {", ".join(ORDER_STATUSES)}')
+    return queryset.values_list(*EXPORT_FIELDS[name])
+
+
+class _Lines:
+    # файл для csv.writer: writerow возвращает записанную строку
+    def write(self, line):
+        return line
+
+
+def _csv_cell(value):
+    if isinstance(value, list):
+        return json.dumps(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def export_lines(name, queryset, output, chunk_size):
+    # Генератор текста выгрузки: каждая пачка из chunk_size строк - одна часть ответа
+    fields = EXPORT_FIELDS[name]
+    rows = queryset.iterator(chunk_size=chunk_size)
+
+    if output == 'csv':
+        writer = csv.writer(_Lines())
+        yield writer.writerow(fields)
+        for batch in batches(rows, chunk_size):
+            yield ''.join(writer.writerow([_csv_cell(value) for value in row]) for row in batch)
+    elif output == 'ndjson':
+        encoder = DjangoJSONEncoder()
+        for batch in batches(rows, chunk_size):
+            yield ''.join(encoder.encode(dict(zip(fields, row))) + '\n' for row in batch)
+    else:
+        raise ValueError(f'Output must be one of {", ".join(EXPORT_CONTENT_TYPES)}')
@@ -0,0 +1,117 @@
+import numpy as np
+
+# Векторизованная предварительная проверка пар курьер-заказ для движка распределения.
+# Заказы курьера проверяются пачками: регион, вес и пересечение интервалов считаются
+# сразу для всей пачки, жадный алгоритм затем проходит только по прошедшим проверку.
+# Проверка - необходимое условие: она использует минимально возможные для курьера
+# лимиты, поэтому точная проверка get_limit / overlap даёт тот же результат, что и без неё
+
+CHUNK_SIZE = 4096
+
+
+class FeasibilityIndex:
+
+    def __init__(self, orders):
+        # orders - уже отсортированный список OrderRecord
+        size = len(orders)
+        width = max((len(order.delivery_hours) for order in orders), default=0) or 1
+
+        self.weight = np.fromiter((order.weight for order in orders), dtype=np.float64, count=size)
+        self.starts = np.zeros((size, width), dtype=np.int32)
+        self.ends = np.zeros((size, width), dtype=np.int32)
+        self.valid = np.zeros((size, width), dtype=bool)
+        for position, order in enumerate(orders):
+            for slot, (start, end) in enumerate(order.delivery_hours):
+                self.starts[position, slot] = start
+                self.ends[position, slot] = end
+                self.valid[position, slot] = True
+
+        # регион -> отсортированные позиции его заказов
+        self.regions = np.fromiter((order.regions for order in orders), dtype=np.int64, count=size)
+        order_by_region = np.argsort(self.regions, kind='stable')
+        values, first = np.unique(self.regions[order_by_region], return_index=True)
+        self.by_region = {
+            int(region): positions
+            for region, positions in zip(values, np.split(order_by_region, first[1:]))
+        } if size else {}
+
+    def assigned_mask(self):
+        return np.zeros(len(self.weight), dtype=bool)
+
+    @staticmethod
+    def allowed_regions(state):
+        # набрав максимум регионов, курьер может брать заказы только в них
+        if len(state.pending_regions) >= state.limits.max_regions_amount:
+            return state.pending_regions & state.regions
+        return state.regions
+
+    def candidates(self, state, assigned):
+        # Позиции заказов, которые курьер может взять, в порядке возрастания.
+        # Списки регионов сливаются пачками: за один шаг берутся позиции не дальше
+        # границы, до которой просмотрены все регионы
+        arrays = {region: self.by_region[region] for region in self.allowed_regions(state) 
+                  if region in self.by_region}
+        pointers = dict.fromkeys(arrays, 0)
+
+        while True:
+            frontier = None
+            for region, array in arrays.items():
+                if pointers[region] + CHUNK_SIZE < len(array):
+                    last = array[pointers[region] + CHUNK_SIZE - 1]
+                    frontier = last if frontier is None else min(frontier, last)
+
+            parts = []
+            for region, array in arrays.items():
+                chunk = array[pointers[region]:pointers[region] + CHUNK_SIZE]
+                if frontier is not None:
+                    chunk = chunk[:np.searchsorted(chunk, frontier, side='right')]
+                pointers[region] += len(chunk)
+                parts.append(chunk)
+
+            positions = np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+            if not len(positions):
+                return
+
+            positions = self.filter(state, positions, assigned)
+            while len(positions):
+                pending_count = state.pending_count
+                yield int(positions[0])
+                if state.is_full:
+                    return
+                positions = positions[1:]
+                if state.pending_count != pending_count:
+                    # курьер взял заказ: оставшиеся позиции перепроверяются с новой загрузкой
+                    positions = self.filter(state, positions, assigned)
+                    regions = self.allowed_regions(state)
+                    arrays = {region: array for region, array in arrays.items() if region in regions}
+
+    def filter(self, state, positions, assigned):
+        positions = positions[~assigned[positions]]
+        if len(state.pending_regions) >= state.limits.max_regions_amount:
+            positions = positions[np.isin(self.regions[positions], list(state.pending_regions))]
+        return positions[self.feasible(state, positions)]
+
+    def feasible(self, state, positions):
+        limits = state.limits
+        mask = self.weight[positions] + state.pending_weight <= limits.max_carriable_weight
+
+        # минимальный лимит времени: курьер уже набрал pending_count заказов
+        # в len(pending_regions) регионах, и следующий заказ его только увеличит
+        regions_amount = len(state.pending_regions)
+        if regions_amount:
+            limit = regions_amount * limits.first_order_in_region_time \
+                + (state.pending_count - regions_amount) * limits.subsequent_orders_in_region_time
+        else:
+            limit = limits.first_order_in_region_time
+
+        starts = self.starts[positions]
+        ends = self.ends[positions]
+        fits = np.zeros(starts.shape, dtype=bool)
+        for working_start, working_end in state.working_hours:
+            fits |= (working_start <= starts) & (starts <= ends) & (ends <= working_end)
+            fits |= (working_start <= starts) & (starts <= working_end) & (working_end - starts >= limit)
+            fits |= (starts <= working_start) & (working_start <= ends) & (ends - working_start >= limit)
+            fits |= (starts <= working_end) & (working_end <= ends) & (ends - working_end >= limit)
+        fits &= self.valid[positions]
+
+        return mask & fits.any(axis=1)
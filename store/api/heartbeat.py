@@ -0,0 +1,43 @@
+import logging
+import threading
+from django.db import connection
+
+# Отметка «владелец жив» для долгих операций (ключи идемпотентности, фоновые распределения):
+# beat() выполняется раз в interval секунд в отдельном потоке со своим соединением,
+# поэтому отметка видна сразу, даже если операция идёт в одной транзакции.
+# wake() выполняет beat() сразу, не дожидаясь интервала (прогресс фонового распределения)
+
+logger = logging.getLogger(__name__)
+
+
+class Heartbeat(threading.Thread):
+
+    def __init__(self, beat, interval):
+        super().__init__(daemon=True)
+        self.beat = beat
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.woken = threading.Event()
+
+    def run(self):
+        try:
+            while True:
+                self.woken.wait(self.interval)
+                self.woken.clear()
+                if self.stopped.is_set():
+                    return
+                try:
+                    self.beat()
+                except Exception:
+                    # отметка не записана: повторится на следующем шаге
+                    logger.exception('Heartbeat failed')
+        finally:
+            connection.close()
+
+    def wake(self):
+        self.woken.set()
+
+    def stop(self):
+        self.stopped.set()
+        self.woken.set()
+        self.join()
@@ -0,0 +1,122 @@
+import datetime
+import functools
+import hashlib
+import json
+import logging
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from .heartbeat import Heartbeat
+from .models import IdempotencyKey
+
+# Повторы POST с заголовком Idempotency-Key. Первый запрос с ключом занимает строку
+# IdempotencyKey (уникальна по эндпоинту и ключу) отдельной транзакцией, пока выполняется -
+# раз в четверть IDEMPOTENCY_PROCESSING_TIMEOUT отмечает heartbeat_at, после выполнения
+# сохраняет в строку успешный ответ. Повтор получает сохранённый ответ без обращения к данным,
+# одновременный повтор - 409, тот же ключ с другим телом - 422. Ключ неуспешного запроса
+# освобождается, ключ запроса, переставшего отмечаться (упавший процесс), занимает повтор.
+# Ответ сохраняется отрендеренными байтами и отдаётся повтору без изменений.
+# Тело NDJSON читается потоком и не сверяется
+
+logger = logging.getLogger(__name__)
+
+KEY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def request_hash(request):
+    if request.content_type.startswith('application/x-ndjson'):
+        return ''
+    return hashlib.sha256(json.dumps(request.data, cls=JSONEncoder, sort_keys=True).encode()).hexdigest()
+
+
+def _stale(record, now):
+    # ответ хранится IDEMPOTENCY_KEY_TTL, незавершённый запрос жив, пока отмечается
+    if record.status_code is not None:
+        return record.created_at < now - datetime.timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    return record.heartbeat_at < now - datetime.timedelta(seconds=settings.IDEMPOTENCY_PROCESSING_TIMEOUT)
+
+
+def claim_key(scope, key, digest):
+    # Возвращает (занятая строка, None) или (None, строка первого запроса с этим ключом)
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(scope=scope, key=key, request_hash=digest), None
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+        if record is None:
+            continue
+        if not _stale(record, timezone.now()):
+            return None, record
+        # устаревшую строку удаляем, если её не успели изменить, и занимаем ключ заново
+        IdempotencyKey.objects.filter(
+            pk=record.pk, status_code=record.status_code, heartbeat_at=record.heartbeat_at
+        ).delete()
+    return None, None
+
+
+def replay(record, digest):
+    if record is None or record.status_code is None:
+        return Response({'detail': 'A request with this Idempotency-Key is in progress'},
+                        status=status.HTTP_409_CONFLICT)
+    if record.request_hash != digest:
+        return Response({'detail': 'Idempotency-Key was used with a different request body'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    response = HttpResponse(bytes(record.response), status=record.status_code, content_type=record.content_type)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(view):
+    # Декоратор действия вьюсета; запросы без заголовка Idempotency-Key выполняются как обычно.
+    # Ключи различаются по эндпоинту: 'orders.create', 'couriers.bulk_ingest', ...
+    @functools.wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        scope = f'{self.content_field}.{view.__name__}'
+        key = request.META.get(KEY_HEADER)
+        if not key:
+            return view(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        digest = request_hash(request)
+        record, first = claim_key(scope, key, digest)
+        if record is None:
+            return replay(first, digest)
+
+        heartbeat = Heartbeat(
+            lambda: IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True)
+            .update(heartbeat_at=timezone.now()),
+            settings.IDEMPOTENCY_PROCESSING_TIMEOUT / 4
+        )
+        heartbeat.start()
+        try:
+            response = view(self, request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+        finally:
+            heartbeat.stop()
+
+        if not status.is_success(response.status_code):
+            record.delete()
+            return response
+        # ответ рендерится здесь же, сохраняются те байты, которые получит клиент
+        response = self.finalize_response(request, response)
+        response.render()
+        saved = IdempotencyKey.objects.filter(pk=record.pk).update(
+            status_code=response.status_code,
+            response=response.content,
+            content_type=response['Content-Type']
+        )
+        if not saved:
+            logger.warning('Idempotency key %s (%s) was taken over while the request was running',
+                           key, scope)
+        return response
+    return wrapper
@@ -0,0 +1,56 @@
+import json
+from itertools import islice
+from django.db import transaction
+
+# Пакетная загрузка курьеров и заказов: данные валидируются пачками
+# и вставляются через bulk_create в одной транзакции
+
+
+def iter_ndjson(stream):
+    # Читает тело запроса построчно, не загружая его в память целиком
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def batches(items, size):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def bulk_ingest(serializer_class, items, batch_size, on_saved=None):
+    # Возвращает (ids, errors). При любой ошибке валидации ничего не сохраняется,
+    # но остальные пачки всё равно проверяются, чтобы вернуть все ошибки сразу.
+    # on_saved(objects) вызывается для каждой сохранённой пачки в той же транзакции
+    model = serializer_class.Meta.model
+    ids = []
+    errors = {}
+
+    with transaction.atomic():
+        offset = 0
+        for batch in batches(items, batch_size):
+            serializer = serializer_class(data=batch, many=True)
+            if not serializer.is_valid():
+                errors.update(
+                    (offset + index, item_errors)
+                    for index, item_errors in enumerate(serializer.errors) if item_errors
+                )
+            elif not errors:
+                created = model.objects.bulk_create(
+                    [model(**item) for item in serializer.validated_data]
+                )
+                ids += [obj.pk for obj in created]
+                if on_saved is not None:
+                    on_saved(created)
+            offset += len(batch)
+
+        if errors:
+            transaction.set_rollback(True)
+            ids = []
+
+    return ids, errors
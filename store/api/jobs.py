@@ -0,0 +1,126 @@
+import datetime
+import traceback
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .heartbeat import Heartbeat
+from .models import AssignmentJob
+from .services import run_assignment
+
+# Очередь фоновых распределений заказов в таблице AssignmentJob, без внешнего брокера
+
+
+def enqueue_assignment(assignment_date, regions=None, batch_size=None):
+    # Ставит распределение за дату в очередь. Если задача за эту дату уже ждёт
+    # или выполняется, возвращает её, чтобы повторный запрос не распределял заказы дважды
+    # (её regions и batch_size могут отличаться от запрошенных - см. same_params)
+    expire_jobs()
+    for _ in range(3):
+        try:
+            with transaction.atomic():
+                return AssignmentJob.objects.create(
+                    assignment_date=assignment_date, regions=regions, batch_size=batch_size
+                )
+        except IntegrityError:
+            job = AssignmentJob.objects.filter(
+                assignment_date=assignment_date, status__in=['queued', 'running']
+            ).first()
+        # задача могла завершиться между вставкой и чтением - пробуем поставить снова
+        if job is not None:
+            return job
+    raise IntegrityError(f'Could not enqueue assignment for {assignment_date}')
+
+
+def same_params(job, regions, batch_size):
+    return job.regions == regions and job.batch_size == batch_size
+
+
+def expire_jobs():
+    # Задачи, обработчик которых перестал отмечаться дольше ASSIGNMENT_JOB_LEASE_SECONDS
+    # (упал процесс), помечаются failed: иначе они навсегда занимают свою дату
+    cutoff = timezone.now() - datetime.timedelta(seconds=settings.ASSIGNMENT_JOB_LEASE_SECONDS)
+    with transaction.atomic():
+        # у задач, начатых до появления отметок, её роль играет started_at
+        jobs = list(AssignmentJob.objects.select_for_update(skip_locked=True).filter(
+            Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+            status='running'
+        ))
+        for job in jobs:
+            job.status = 'failed'
+            job.error = 'Worker stopped responding'
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'error', 'finished_at'])
+    return len(jobs)
+
+
+def claim_job():
+    # Берёт самую старую задачу из очереди. Задачи, уже захваченные другим
+    # обработчиком, пропускаются (SKIP LOCKED), поэтому обработчиков может быть несколько
+    expire_jobs()
+    with transaction.atomic():
+        job = AssignmentJob.objects.select_for_update(skip_locked=True).filter(
+            status='queued'
+        ).order_by('id').first()
+        if job is not None:
+            job.status = 'running'
+            job.started_at = job.heartbeat_at = timezone.now()
+            job.save(update_fields=['status', 'started_at', 'heartbeat_at'])
+    return job
+
+
+def run_job(job):
+    # Пока задача выполняется, heartbeat_at обновляется из отдельного потока со своим
+    # соединением. Распределение может идти в одной транзакции, поэтому прогресс
+    # записывается тем же потоком (сразу, через wake) и виден до её окончания
+    reported = {}
+
+    def beat():
+        AssignmentJob.objects.filter(pk=job.pk, status='running').update(
+            heartbeat_at=timezone.now(), **reported
+        )
+
+    def progress(stage, percent):
+        reported.update(stage=stage, progress=percent)
+        heartbeat.wake()
+
+    heartbeat = Heartbeat(beat, settings.ASSIGNMENT_JOB_LEASE_SECONDS / 4)
+    heartbeat.start()
+    try:
+        result = run_assignment(
+            job.assignment_date.isoformat(), regions=job.regions, batch_size=job.batch_size,
+            progress=progress
+        )
+    except Exception:
+        job.status = 'failed'
+        job.error = traceback.format_exc()
+        # этап, на котором распределение упало
+        job.stage = reported.get('stage', job.stage)
+        job.progress = reported.get('progress', job.progress)
+    else:
+        job.status = 'done'
+        job.stage = 'done'
+        job.progress = 100
+        job.result = result
+    finally:
+        heartbeat.stop()
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'stage', 'progress', 'result', 'error', 'finished_at'])
+    return job
+
+
+def job_status(job):
+    return {
+        'job_id': job.pk,
+        'status': job.status,
+        'date': str(job.assignment_date),
+        'regions': job.regions,
+        'batch_size': job.batch_size,
+        'stage': job.stage,
+        'progress': job.progress,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+        'result': job.result,
+        'error': job.error or None,
+    }
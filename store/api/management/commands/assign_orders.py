@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from api.services import run_assignment, run_incremental_assignment
+
+
+class Command(BaseCommand):
+    help = ('Распределяет нераспределённые заказы по курьерам. Несколько команд с разными '
+            '--regions могут работать одновременно')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--regions', type=int, nargs='+')
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--incremental', action='store_true',
+                            help='Только заказы, созданные после прошлого инкрементального распределения')
+
+    def handle(self, *args, **options):
+        assignment_date = timezone.localdate().isoformat()
+        if options['incremental']:
+            content = run_incremental_assignment(assignment_date)
+        else:
+            content = run_assignment(assignment_date, regions=options['regions'], batch_size=options['batch_size'])
+        orders = sum(len(courier['orders']['orders']) for courier in content['couriers'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Assigned {orders} orders to {len(content["couriers"])} couriers'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from api.stats import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает дневную статистику курьеров по выполненным заказам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            created = rebuild_daily_stats(options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f'Created {created} daily stats rows'))
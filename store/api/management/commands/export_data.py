@@ -0,0 +1,35 @@
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from api.export import EXPORT_CONTENT_TYPES, EXPORT_FIELDS, ORDER_STATUSES, export_lines, export_queryset
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка заказов или курьеров в CSV или NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=list(EXPORT_FIELDS))
+        parser.add_argument('--output', choices=list(EXPORT_CONTENT_TYPES), default='csv')
+        parser.add_argument('--file', help='Файл выгрузки, по умолчанию stdout')
+        parser.add_argument('--start-date', help='Дата распределения заказа от (YYYY-MM-DD)')
+        parser.add_argument('--end-date', help='Дата распределения заказа до включительно (YYYY-MM-DD)')
+        parser.add_argument('--courier-id', type=int, nargs='+')
+        parser.add_argument('--status', choices=ORDER_STATUSES)
+        parser.add_argument('--chunk-size', type=int, default=settings.EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            queryset = export_queryset(
+                options['name'], start_date=options['start_date'], end_date=options['end_date'],
+                courier_ids=options['courier_id'], status=options['status']
+            )
+        except ValueError as error:
+            raise CommandError(error)
+
+        file = open(options['file'], 'w', newline='') if options['file'] else sys.stdout
+        try:
+            for part in export_lines(options['name'], queryset, options['output'], options['chunk_size']):
+                file.write(part)
+        finally:
+            if file is not sys.stdout:
+                file.close()
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from api.partitions import maintain_partitions
+
+
+class Command(BaseCommand):
+    help = 'Создаёт секции таблицы заказов на будущие месяцы и переносит старые выполненные заказы в архив'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=settings.ORDER_PARTITIONS_AHEAD,
+                            help='На сколько месяцев вперёд создавать секции')
+        parser.add_argument('--archive-after', type=int, default=settings.ORDER_ARCHIVE_AFTER_MONTHS,
+                            help='Архивировать секции месяцев, закончившихся столько месяцев назад')
+
+    def handle(self, *args, **options):
+        created, archived = maintain_partitions(
+            timezone.localdate(), options['ahead'], options['archive_after']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Created {created} partitions, archived {archived} partitions'))
@@ -0,0 +1,20 @@
+import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from api.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Удаляет ключи идемпотентности (Idempotency-Key) старше IDEMPOTENCY_KEY_TTL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl', type=int, default=settings.IDEMPOTENCY_KEY_TTL,
+                            help='Возраст ключа в секундах, после которого он удаляется')
+
+    def handle(self, *args, **options):
+        deleted, _ = IdempotencyKey.objects.filter(
+            created_at__lt=timezone.now() - datetime.timedelta(seconds=options['ttl'])
+        ).delete()
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} idempotency keys'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from api.capacity import rebuild_capacity
+from api.models import Couriers
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики недоставленных заказов курьеров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # распределение и завершение заказов ждут окончания пересчёта
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {Couriers._meta.db_table} IN EXCLUSIVE MODE')
+            updated = rebuild_capacity(options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} couriers with pending orders'))
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+from api.jobs import claim_job, run_job
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые распределения заказов из очереди (POST /orders/assign?async=1)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить задачи, которые уже в очереди, и завершиться')
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+
+            job = run_job(job)
+            if job.status == 'done':
+                self.stdout.write(self.style.SUCCESS(
+                    f'Job {job.pk}: assigned orders to {len(job.result["couriers"])} couriers'
+                ))
+            else:
+                self.stderr.write(f'Job {job.pk} failed:\n{job.error}')
@@ -0,0 +1,51 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from api import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время, количество запросов и пик памяти эндпоинтов на синтетических данных. '
+            'Удаляет всех курьеров и заказы из базы!')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000', 
+                            help='Количества нераспределённых заказов через запятую')
+        parser.add_argument('--couriers-ratio', type=float, default=0.1)
+        parser.add_argument('--history-ratio', type=float, default=1.0,
+                            help='Выполненных заказов в истории на один новый заказ')
+        parser.add_argument('--regions', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--compare', help='JSON с результатами предыдущего запуска')
+        parser.add_argument('--flush', action='store_true', 
+                            help='Подтверждение, что данные в базе можно удалить')
+        parser.add_argument('--serialization', action='store_true',
+                            help='Только сериализация ответов (ModelSerializer против быстрого пути), без БД')
+
+    def handle(self, *args, **options):
+        if not options['flush'] and not options['serialization']:
+            raise CommandError('The benchmark deletes all couriers and orders, pass --flush to confirm')
+
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        results = benchmark.run(
+            sizes, couriers_ratio=options['couriers_ratio'], history_ratio=options['history_ratio'],
+            regions=options['regions'], repeat=options['repeat'], random_seed=options['seed'],
+            serialization=options['serialization']
+        )
+        benchmark.dump(results, options['output'])
+
+        for result in results['results']:
+            self.stdout.write(
+                f'{result["size"]:>8} {result["endpoint"]:<40} {result["wall_ms"]:>10.1f} ms '
+                f'{result["queries"]:>6} queries {result["peak_memory_kb"]:>10.1f} KiB'
+            )
+
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = json.load(file)
+            self.stdout.write('')
+            for line in benchmark.compare(baseline, results):
+                self.stdout.write(line)
+
+        self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.seeding import DEFAULT_DELIVERY_HOURS, DEFAULT_TYPES, DEFAULT_WORKING_HOURS, HoursDistribution, flush, seed
+
+
+def parse_types(value):
+    # 'FOOT:0.4,BIKE:0.35,AUTO:0.25' -> {'FOOT': 0.4, ...}
+    types = {}
+    for item in value.split(','):
+        courier_type, share = item.split(':')
+        types[courier_type.strip().upper()] = float(share)
+    if not set(types) <= set(DEFAULT_TYPES):
+        raise CommandError(f'Unknown courier types: {", ".join(set(types) - set(DEFAULT_TYPES))}')
+    return types
+
+
+def parse_distribution(value):
+    # '6-14:240-600' -> начало с 6 до 14 часов, длина от 240 до 600 минут
+    try:
+        hours, lengths = value.split(':')
+        distribution = HoursDistribution(*map(int, hours.split('-') + lengths.split('-')))
+    except (TypeError, ValueError):
+        raise CommandError(f'Invalid hours distribution: {value}, expected EARLIEST-LATEST:MIN-MAX')
+    if not (0 <= distribution.earliest <= distribution.latest <= 23 
+            and 0 < distribution.min_length <= distribution.max_length):
+        raise CommandError(f'Invalid hours distribution: {value}')
+    return distribution
+
+
+def format_distribution(distribution):
+    return f'{distribution.earliest}-{distribution.latest}:{distribution.min_length}-{distribution.max_length}'
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими курьерами и заказами'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--couriers', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=10000, 
+                            help='Количество нераспределённых заказов')
+        parser.add_argument('--history', type=int, default=0, 
+                            help='Количество уже выполненных заказов')
+        parser.add_argument('--history-days', type=int, default=30)
+        parser.add_argument('--regions', type=int, default=20)
+        parser.add_argument('--types', type=parse_types, default=DEFAULT_TYPES,
+                            help='Доли типов курьеров, например FOOT:0.4,BIKE:0.35,AUTO:0.25')
+        parser.add_argument('--working-hours', type=parse_distribution, default=DEFAULT_WORKING_HOURS,
+                            help='Рабочие интервалы курьеров: часы начала и длина в минутах, '
+                                 f'по умолчанию {format_distribution(DEFAULT_WORKING_HOURS)}')
+        parser.add_argument('--delivery-hours', type=parse_distribution, default=DEFAULT_DELIVERY_HOURS,
+                            help='Интервалы доставки заказов: часы начала и длина в минутах, '
+                                 f'по умолчанию {format_distribution(DEFAULT_DELIVERY_HOURS)}')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--flush', action='store_true', 
+                            help='Удалить всех курьеров и заказы перед заполнением')
+
+    def handle(self, *args, **options):
+        if options['flush']:
+            flush()
+
+        seed(options['couriers'], options['orders'], regions=options['regions'], 
+             history=options['history'], history_days=options['history_days'], 
+             types=options['types'], working_hours=options['working_hours'], 
+             delivery_hours=options['delivery_hours'], random_seed=options['seed'], 
+             batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {options["couriers"]} couriers, {options["orders"]} orders '
+            f'and {options["history"]} completed orders'
+        ))
@@ -0,0 +1,136 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+# Метрики запросов в памяти процесса: время ответа, количество SQL-запросов и время в БД
+# по каждому эндпоинту (для вьюсетов - Класс.действие). Отдаются в текстовом формате
+# Prometheus на /metrics; при нескольких процессах у каждого свои гистограммы.
+# Время потоковых ответов считается до начала отдачи тела
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+LABELS = ('view', 'method', 'status')
+
+
+class Histogram:
+
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        # метки -> [количество по корзинам (последняя - +Inf), сумма значений]
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.setdefault(labels, [[0] * (len(self.buckets) + 1), 0])
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self.series.items())
+
+        for labels, counts, total in series:
+            labels = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(LABELS, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {cumulative}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Request latency in seconds', LATENCY_BUCKETS
+)
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'SQL queries per request', QUERY_BUCKETS
+)
+REQUEST_DB_DURATION = Histogram(
+    'http_request_db_duration_seconds', 'Time spent in SQL queries per request', LATENCY_BUCKETS
+)
+HISTOGRAMS = (REQUEST_DURATION, REQUEST_QUERIES, REQUEST_DB_DURATION)
+
+
+class QueryStats:
+    # execute_wrapper: считает запросы, их суммарное время и самый медленный запрос
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = (0.0, None)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.count += 1
+            self.duration += duration
+            if duration >= self.slowest[0]:
+                self.slowest = (duration, sql)
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    actions = getattr(match.func, 'actions', None) or {}
+    viewset = getattr(match.func, 'cls', None)
+    if viewset is not None and request.method.lower() in actions:
+        return f'{viewset.__name__}.{actions[request.method.lower()]}'
+    return match.view_name or match.route
+
+
+class MetricsMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryStats()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        labels = (view_label(request), request.method, str(response.status_code))
+        REQUEST_DURATION.observe(labels, duration)
+        REQUEST_QUERIES.observe(labels, queries.count)
+        REQUEST_DB_DURATION.observe(labels, queries.duration)
+
+        slow_seconds = settings.METRICS_SLOW_REQUEST_SECONDS
+        slow_queries = settings.METRICS_SLOW_REQUEST_QUERIES
+        if (slow_seconds is not None and duration >= slow_seconds) or \
+                (slow_queries is not None and queries.count >= slow_queries):
+            slowest_duration, slowest_sql = queries.slowest
+            logger.warning(
+                'Slow request %s %s (%s): %.3f s, %d queries, %.3f s in DB; slowest query %.3f s: %s',
+                request.method, request.path, labels[0], duration, queries.count, queries.duration,
+                slowest_duration, (slowest_sql or '')[:2000]
+            )
+        return response
+
+
+def metrics(request):
+    lines = [line for histogram in HISTOGRAMS for line in histogram.render()]
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
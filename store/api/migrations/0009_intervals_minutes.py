@@ -0,0 +1,86 @@
+# Generated by Django 4.2.1 on 2026-10-18 18:54
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+from django.db.backends.postgresql.psycopg_any import NumericRange
+
+
+def parse_hours(intervals):
+    # ['10:00-11:00'] -> [[600, 660]]; строки в неверном формате пропускаем
+    hours = []
+    for interval in intervals:
+        try:
+            start, end = [int(h) * 60 + int(m) for h, m in 
+                          (time.split(':') for time in interval.split('-'))]
+        except ValueError:
+            continue
+        hours.append([start, end])
+    return hours
+
+
+def hours_span(hours):
+    if not hours:
+        return None
+    return NumericRange(min(min(interval) for interval in hours), 
+                        max(max(interval) for interval in hours), '[]')
+
+
+def fill_minutes(apps, schema_editor):
+    Couriers = apps.get_model('api', 'Couriers')
+    Orders = apps.get_model('api', 'Orders')
+
+    for model, source, minutes, span in (
+        (Couriers, 'working_hours', 'working_minutes', 'working_span'),
+        (Orders, 'delivery_hours', 'delivery_minutes', 'delivery_span'),
+    ):
+        batch = []
+        for obj in model.objects.only('id', source).order_by('id').iterator(chunk_size=2000):
+            hours = parse_hours(getattr(obj, source))
+            setattr(obj, minutes, hours)
+            setattr(obj, span, hours_span(hours))
+            batch.append(obj)
+            if len(batch) == 2000:
+                model.objects.bulk_update(batch, [minutes, span])
+                batch = []
+        model.objects.bulk_update(batch, [minutes, span])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_alter_orders_assignment_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='couriers',
+            name='working_minutes',
+            field=django.contrib.postgres.fields.ArrayField(base_field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), size=2), default=list, size=None),
+        ),
+        migrations.AddField(
+            model_name='couriers',
+            name='working_span',
+            field=django.contrib.postgres.fields.ranges.IntegerRangeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='orders',
+            name='delivery_minutes',
+            field=django.contrib.postgres.fields.ArrayField(base_field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), size=2), default=list, size=None),
+        ),
+        migrations.AddField(
+            model_name='orders',
+            name='delivery_span',
+            field=django.contrib.postgres.fields.ranges.IntegerRangeField(null=True),
+        ),
+        migrations.RunPython(fill_minutes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='couriers',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['working_span'], name='couriers_working_span_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orders',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['delivery_span'], name='orders_delivery_span_idx'),
+        ),
+    ]
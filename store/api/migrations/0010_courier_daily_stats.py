@@ -0,0 +1,32 @@
+# Generated by Django 4.2.1 on 2026-10-18 18:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_intervals_minutes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourierDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('completed_orders', models.IntegerField(default=0)),
+                ('orders_cost', models.BigIntegerField(default=0)),
+                ('courier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='api.couriers')),
+            ],
+            options={
+                'verbose_name_plural': 'Courier daily stats',
+                'ordering': ['courier', 'day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='courierdailystats',
+            constraint=models.UniqueConstraint(fields=('courier', 'day'), name='courier_daily_stats_unique'),
+        ),
+    ]
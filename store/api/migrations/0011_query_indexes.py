@@ -0,0 +1,34 @@
+# Generated by Django 4.2.1 on 2026-10-18 18:58
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_courier_daily_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='couriers',
+            index=models.Index(fields=['courier_type'], name='couriers_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='couriers',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['regions'], name='couriers_regions_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orders',
+            index=models.Index(condition=models.Q(('complete_time__isnull', True), ('courier__isnull', True)), fields=['id'], name='orders_unassigned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orders',
+            index=models.Index(fields=['assignment_date', 'courier', 'id'], name='orders_assignment_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orders',
+            index=models.Index(fields=['courier', 'complete_time'], name='orders_courier_complete_idx'),
+        ),
+    ]
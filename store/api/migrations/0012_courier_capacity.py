@@ -0,0 +1,59 @@
+# Generated by Django 4.2.1 on 2026-10-18 18:59
+
+import django.contrib.postgres.fields
+from itertools import groupby
+from django.db import migrations, models
+
+
+def fill_capacity(apps, schema_editor):
+    Couriers = apps.get_model('api', 'Couriers')
+    Orders = apps.get_model('api', 'Orders')
+
+    pending = Orders.objects.filter(
+        courier__isnull=False, complete_time__isnull=True
+    ).order_by('courier_id', 'id').values_list('courier_id', 'weight', 'regions')
+
+    couriers = []
+    for courier_id, orders in groupby(pending.iterator(chunk_size=2000), key=lambda row: row[0]):
+        orders = list(orders)
+        couriers.append(Couriers(
+            pk=courier_id, pending_count=len(orders), 
+            pending_weight=sum(weight for _, weight, _ in orders),
+            pending_regions=[regions for _, _, regions in orders]
+        ))
+    Couriers.objects.bulk_update(couriers, ['pending_count', 'pending_weight', 'pending_regions'], 
+                                 batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='couriers',
+            name='couriers_type_idx',
+        ),
+        migrations.AddField(
+            model_name='couriers',
+            name='pending_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='couriers',
+            name='pending_regions',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, size=None),
+        ),
+        migrations.AddField(
+            model_name='couriers',
+            name='pending_weight',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(fill_capacity, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='couriers',
+            index=models.Index(fields=['courier_type', 'pending_count'], name='couriers_capacity_idx'),
+        ),
+    ]
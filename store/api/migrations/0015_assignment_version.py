@@ -0,0 +1,23 @@
+# Generated by Django 4.2.1 on 2026-10-18 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_assignment_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='couriers',
+            name='assignment_version',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='couriers',
+            name='assignments_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
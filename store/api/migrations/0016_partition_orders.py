@@ -0,0 +1,107 @@
+# Generated by Django 4.2.1 on 2026-10-18 19:29
+
+import datetime
+import django.contrib.postgres.fields
+import django.contrib.postgres.fields.ranges
+from django.db import migrations, models
+
+# Имена и вспомогательные функции зафиксированы здесь, а не импортируются из api.partitions:
+# миграция не должна меняться вместе с кодом приложения
+ORDERS_TABLE = 'api_orders'
+ARCHIVE_TABLE = 'api_orders_archive'
+DEFAULT_PARTITION = 'api_orders_default'
+
+
+def next_month(month):
+    return datetime.date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def create_partition(cursor, month):
+    cursor.execute(
+        f"CREATE TABLE {ORDERS_TABLE}_y{month.year}m{month.month:02d} PARTITION OF {ORDERS_TABLE} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+    )
+
+
+def partition_orders(apps, schema_editor):
+    # Пересоздаёт api_orders секционированной по месяцам assignment_date: индексы и внешние ключи
+    # переносятся с прежней таблицы с теми же именами, identity-столбец id заменяется
+    # последовательностью (identity у секционированных таблиц нет)
+    unpartitioned = f'{ORDERS_TABLE}_unpartitioned'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() '
+            'AND tablename = %s AND indexname <> %s', [ORDERS_TABLE, f'{ORDERS_TABLE}_pkey']
+        )
+        indexes = [indexdef for indexdef, in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'", [ORDERS_TABLE]
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            f"SELECT DISTINCT date_trunc('month', assignment_date)::date FROM {ORDERS_TABLE} "
+            f"WHERE assignment_date IS NOT NULL"
+        )
+        # секции создаются только для месяцев, которые есть в данных,
+        # будущие месяцы создаёт команда maintain_order_partitions
+        months = [month for month, in cursor.fetchall()]
+
+        cursor.execute(f'ALTER TABLE {ORDERS_TABLE} RENAME TO {unpartitioned}')
+        cursor.execute(
+            f'CREATE TABLE {ORDERS_TABLE} (LIKE {unpartitioned} INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE (assignment_date)'
+        )
+        cursor.execute(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {ORDERS_TABLE} DEFAULT')
+        for month in sorted(months):
+            create_partition(cursor, month)
+        cursor.execute(f'INSERT INTO {ORDERS_TABLE} SELECT * FROM {unpartitioned}')
+        cursor.execute(f'DROP TABLE {unpartitioned}')
+
+        sequence = f'{ORDERS_TABLE}_id_seq'
+        cursor.execute(f'CREATE SEQUENCE {sequence} OWNED BY {ORDERS_TABLE}.id')
+        cursor.execute(f"SELECT setval('{sequence}', COALESCE(MAX(id), 0) + 1, false) FROM {ORDERS_TABLE}")
+        cursor.execute(f"ALTER TABLE {ORDERS_TABLE} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+        for indexdef in indexes:
+            cursor.execute(indexdef)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {ORDERS_TABLE} ADD CONSTRAINT {name} {definition}')
+
+        cursor.execute(
+            f'CREATE TABLE {ARCHIVE_TABLE} (LIKE {ORDERS_TABLE}) PARTITION BY RANGE (assignment_date)'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_assignment_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_orders),
+        migrations.CreateModel(
+            name='ArchivedOrders',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('assignment_date', models.DateField(null=True)),
+                ('weight', models.FloatField()),
+                ('regions', models.IntegerField()),
+                ('delivery_hours', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=11), size=None)),
+                ('delivery_minutes', django.contrib.postgres.fields.ArrayField(base_field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), size=2), default=list, size=None)),
+                ('delivery_span', django.contrib.postgres.fields.ranges.IntegerRangeField(null=True)),
+                ('cost', models.IntegerField()),
+                ('complete_time', models.DateTimeField(null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Archived orders',
+                'db_table': 'api_orders_archive',
+                'ordering': ['id'],
+                'managed': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='orders',
+            index=models.Index(fields=['id'], name='orders_id_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-18 19:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_idempotency_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignmentjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
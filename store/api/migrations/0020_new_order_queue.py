@@ -0,0 +1,38 @@
+# Generated by Django 4.2.1 on 2026-10-18 19:43
+
+from django.db import migrations, models
+
+
+def fill_queue(apps, schema_editor):
+    # заказы после отметки прежнего инкрементального распределения попадают в очередь
+    AssignmentState = apps.get_model('api', 'AssignmentState')
+    NewOrder = apps.get_model('api', 'NewOrder')
+    Orders = apps.get_model('api', 'Orders')
+
+    state = AssignmentState.objects.filter(pk=1).first()
+    order_ids = Orders.objects.filter(
+        complete_time__isnull=True, courier__isnull=True, id__gt=state.last_order_id if state else 0
+    ).order_by('id').values_list('id', flat=True)
+    NewOrder.objects.bulk_create(
+        (NewOrder(order_id=order_id) for order_id in order_ids.iterator(chunk_size=2000)), batch_size=2000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_assignment_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewOrder',
+            fields=[
+                ('order_id', models.BigIntegerField(primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.RunPython(fill_queue, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='AssignmentState',
+        ),
+    ]
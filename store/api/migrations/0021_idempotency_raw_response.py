@@ -0,0 +1,38 @@
+# Generated by Django 4.2.1 on 2026-10-18 19:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_new_order_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='content_type',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        # jsonb в bytea не приводится: сохранённые ответы переводятся в текст JSON,
+        # чтобы повторы уже выполненных запросов не выполнялись заново
+        migrations.RunSQL(
+            sql=[
+                'ALTER TABLE api_idempotencykey ALTER COLUMN response TYPE bytea '
+                "USING convert_to(response::text, 'UTF8')",
+                "UPDATE api_idempotencykey SET content_type = 'application/json' WHERE response IS NOT NULL",
+            ],
+            reverse_sql=[
+                'ALTER TABLE api_idempotencykey ALTER COLUMN response TYPE jsonb '
+                "USING convert_from(response, 'UTF8')::jsonb",
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='idempotencykey',
+                    name='response',
+                    field=models.BinaryField(blank=True, null=True),
+                ),
+            ],
+        ),
+    ]
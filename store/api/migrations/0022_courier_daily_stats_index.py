@@ -0,0 +1,23 @@
+# Generated by Django 4.2.1 on 2026-10-18 19:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_idempotency_raw_response'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='courierdailystats',
+            options={'ordering': ['courier_id', 'day'], 'verbose_name_plural': 'Courier daily stats'},
+        ),
+        migrations.AlterField(
+            model_name='courierdailystats',
+            name='courier',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='api.couriers'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.1 on 2026-10-18 20:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_courier_daily_stats_index'),
+    ]
+
+    operations = [
+        # заказы курьера, выполненные в момент времени (stats.boundary_rows), в архиве.
+        # Индекс секционированной таблицы: переносимые секции присоединяются со своим
+        # индексом orders_courier_complete_idx
+        migrations.RunSQL(
+            sql='CREATE INDEX orders_archive_courier_complete_idx ON api_orders_archive (courier_id, complete_time)',
+            reverse_sql='DROP INDEX orders_archive_courier_complete_idx',
+        ),
+    ]
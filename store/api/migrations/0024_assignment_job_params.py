@@ -0,0 +1,24 @@
+# Generated by Django 4.2.1 on 2026-10-18 20:03
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_orders_archive_courier_complete_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignmentjob',
+            name='batch_size',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='assignmentjob',
+            name='regions',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, null=True, size=None),
+        ),
+    ]
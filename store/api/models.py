@@ -1,5 +1,8 @@
 from django.db import models
-from django.contrib.postgres.fields import ArrayField
+from django.utils import timezone
+from django.db.backends.postgresql.psycopg_any import NumericRange
+from django.contrib.postgres.fields import ArrayField, IntegerRangeField
+from django.contrib.postgres.indexes import GinIndex, GistIndex
 
 CHOICES = (
     ('FOOT', 'FOOT'),
@@ -7,14 +10,41 @@ CHOICES = (
     ('AUTO', 'AUTO')
 )
 
+def hours_span(hours):
+    # Отрезок от самой ранней до самой поздней границы интервалов (в минутах),
+    # по нему в БД работает индексируемая проверка пересечения
+    if not hours:
+        return None
+    return NumericRange(min(min(interval) for interval in hours), 
+                        max(max(interval) for interval in hours), '[]')
+
 class Couriers(models.Model):
     courier_type = models.CharField(max_length=10, choices=CHOICES)
     regions = ArrayField(models.IntegerField())
     working_hours = ArrayField(models.CharField(max_length=11))
+    # working_hours, разобранные в пары минут от начала суток: [[600, 660], ...]
+    working_minutes = ArrayField(ArrayField(models.IntegerField(), size=2), default=list)
+    working_span = IntegerRangeField(null=True)
+    # Недоставленные заказы курьера: обновляются при распределении и завершении заказов,
+    # пересчитываются командой rebuild_courier_capacity.
+    # pending_regions содержит регион каждого недоставленного заказа (с повторами)
+    pending_count = models.IntegerField(default=0)
+    pending_weight = models.FloatField(default=0)
+    pending_regions = ArrayField(models.IntegerField(), default=list)
+    # Версия назначенных курьеру заказов: растёт при распределении и завершении его заказов,
+    # по ней GET /couriers/assignments?courier_id= отдаёт ETag / Last-Modified
+    assignment_version = models.IntegerField(default=0)
+    assignments_updated_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ['id', 'courier_type', 'regions', 'working_hours']
         verbose_name_plural = 'Couriers'
+        indexes = [
+            GistIndex(fields=['working_span'], name='couriers_working_span_idx'),
+            # курьеры, которые могут взять ещё заказы
+            models.Index(fields=['courier_type', 'pending_count'], name='couriers_capacity_idx'),
+            GinIndex(fields=['regions'], name='couriers_regions_idx'),
+        ]
 
     def __str__(self):
         return f'Курьер № {self.pk}'
@@ -24,6 +54,9 @@ class Orders(models.Model):
     weight = models.FloatField()
     regions = models.IntegerField()
     delivery_hours = ArrayField(models.CharField(max_length=11))
+    # delivery_hours, разобранные в пары минут от начала суток: [[600, 660], ...]
+    delivery_minutes = ArrayField(ArrayField(models.IntegerField(), size=2), default=list)
+    delivery_span = IntegerRangeField(null=True)
     cost = models.IntegerField()
     complete_time = models.DateTimeField(null=True)
     courier = models.ForeignKey(Couriers, related_name='orders', 
@@ -32,6 +65,139 @@ class Orders(models.Model):
     class Meta:
         ordering = ['id', 'weight', 'regions', 'cost', 'complete_time', 'courier']
         verbose_name_plural = 'Orders'
+        indexes = [
+            GistIndex(fields=['delivery_span'], name='orders_delivery_span_idx'),
+            # нераспределённые заказы для assign_orders
+            models.Index(fields=['id'], name='orders_unassigned_idx',
+                         condition=models.Q(complete_time__isnull=True, courier__isnull=True)),
+            # заказы курьеров за день для GET /couriers/assignments
+            models.Index(fields=['assignment_date', 'courier', 'id'], name='orders_assignment_date_idx'),
+            # выполненные заказы курьера за период и его недоставленные заказы
+            models.Index(fields=['courier', 'complete_time'], name='orders_courier_complete_idx'),
+            # таблица секционирована (api/partitions.py), первичного ключа в БД нет
+            models.Index(fields=['id'], name='orders_id_idx'),
+        ]
+
+    def __str__(self):
+        return f'Заказ № {self.pk}'
+
+class ArchivedOrders(models.Model):
+    # Архив выполненных заказов: секции api_orders за старые месяцы,
+    # перенесённые командой maintain_order_partitions. Таблица создаётся миграцией
+    assignment_date = models.DateField(null=True)
+    weight = models.FloatField()
+    regions = models.IntegerField()
+    delivery_hours = ArrayField(models.CharField(max_length=11))
+    delivery_minutes = ArrayField(ArrayField(models.IntegerField(), size=2), default=list)
+    delivery_span = IntegerRangeField(null=True)
+    cost = models.IntegerField()
+    complete_time = models.DateTimeField(null=True)
+    courier = models.ForeignKey(Couriers, related_name='archived_orders', on_delete=models.DO_NOTHING,
+                                db_constraint=False, default=None, null=True)
+
+    class Meta:
+        managed = False
+        db_table = 'api_orders_archive'
+        ordering = ['id']
+        verbose_name_plural = 'Archived orders'
+
+    def __str__(self):
+        return f'Архивный заказ № {self.pk}'
+
+class CourierDailyStats(models.Model):
+    # Выполненные заказы курьера за день: обновляется вместе с завершением заказов,
+    # пересчитывается командой backfill_courier_stats
+    # отдельный индекс по courier не нужен: courier_id - первый столбец courier_daily_stats_unique
+    courier = models.ForeignKey(Couriers, related_name='daily_stats', on_delete=models.CASCADE, db_index=False)
+    day = models.DateField()
+    completed_orders = models.IntegerField(default=0)
+    orders_cost = models.BigIntegerField(default=0)
+
+    class Meta:
+        # courier_id, а не courier: сортировка по courier подтянула бы JOIN с api_couriers
+        ordering = ['courier_id', 'day']
+        verbose_name_plural = 'Courier daily stats'
+        constraints = [
+            models.UniqueConstraint(fields=['courier', 'day'], name='courier_daily_stats_unique'),
+        ]
+
+    def __str__(self):
+        return f'Статистика курьера № {self.courier_id} за {self.day}'
+
+JOB_STATUSES = (
+    ('queued', 'queued'),
+    ('running', 'running'),
+    ('done', 'done'),
+    ('failed', 'failed')
+)
+
+class AssignmentJob(models.Model):
+    # Фоновое распределение заказов (POST /orders/assign?async=1): задачи из очереди
+    # выполняет команда run_assignment_jobs, result - content ответа POST /orders/assign
+    status = models.CharField(max_length=10, choices=JOB_STATUSES, default='queued')
+    assignment_date = models.DateField()
+    # параметры запроса: ?regions= (None - все регионы) и ?batch_size= (None - одной транзакцией)
+    regions = ArrayField(models.IntegerField(), null=True, blank=True)
+    batch_size = models.IntegerField(null=True, blank=True)
+    stage = models.CharField(max_length=20, blank=True, default='')
+    progress = models.IntegerField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # последняя отметка обработчика: задача без отметки дольше ASSIGNMENT_JOB_LEASE_SECONDS
+    # считается брошенной (api/jobs.py, expire_jobs)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            # на одну дату - не больше одной задачи в очереди или в работе,
+            # повторный запрос возвращает уже поставленную задачу
+            models.UniqueConstraint(fields=['assignment_date'], name='assignment_jobs_active_unique',
+                                    condition=models.Q(status__in=['queued', 'running'])),
+        ]
+        indexes = [
+            models.Index(fields=['id'], name='assignment_jobs_queued_idx',
+                         condition=models.Q(status='queued')),
+        ]
+
+    def __str__(self):
+        return f'Распределение № {self.pk} за {self.assignment_date}'
+
+class NewOrder(models.Model):
+    # Заказы, которые ещё не видело инкрементальное распределение (POST /orders/assign?incremental=1):
+    # строка добавляется в той же транзакции, что и заказ, и удаляется распределением.
+    # Внешнего ключа нет: у секционированной таблицы заказов нет первичного ключа
+    order_id = models.BigIntegerField(primary_key=True)
+
+    def __str__(self):
+        return f'Новый заказ № {self.order_id}'
+
+class IdempotencyKey(models.Model):
+    # Ответ на POST с заголовком Idempotency-Key (api/idempotency.py): повтор запроса
+    # с тем же ключом получает сохранённый ответ. status_code = None - запрос ещё выполняется,
+    # heartbeat_at - его последняя отметка. Тело хранится байтами как было отдано
+    # (в jsonb Postgres переставил бы ключи объектов)
+    scope = models.CharField(max_length=30)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.IntegerField(null=True, blank=True)
+    response = models.BinaryField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    heartbeat_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='idempotency_keys_unique'),
+        ]
+        indexes = [
+            # удаление устаревших ключей (purge_idempotency_keys)
+            models.Index(fields=['created_at'], name='idempotency_keys_created_idx'),
+        ]
 
     def __str__(self):
-        return f'Заказ № {self.pk}'
\ No newline at end of file
+        return f'Ключ {self.key} ({self.scope})'
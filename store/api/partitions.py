@@ -0,0 +1,105 @@
+import datetime
+import re
+from django.db import connection, transaction
+from .cache import invalidate_archived_orders
+
+# Таблица заказов секционирована по месяцам assignment_date (PARTITION BY RANGE): секция
+# api_orders_yГГГГmММ на каждый месяц и секция по умолчанию api_orders_default, в которой лежат
+# нераспределённые заказы (assignment_date IS NULL) и заказы месяцев без своей секции.
+# Распределение читает только секцию по умолчанию, заказы курьеров за день - одну месячную секцию.
+# Первичного ключа нет (ключ секционирования может быть NULL), id выдаёт последовательность.
+# Старые секции, все заказы которых выполнены, отсоединяются от api_orders и присоединяются
+# к архиву api_orders_archive (модель ArchivedOrders): API и выгрузка их больше не видят,
+# пересчёт статистики курьеров учитывает
+
+ORDERS_TABLE = 'api_orders'
+ARCHIVE_TABLE = 'api_orders_archive'
+DEFAULT_PARTITION = 'api_orders_default'
+PARTITION_MONTH = re.compile(r'_y(\d{4})m(\d{2})$')
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month, table=ORDERS_TABLE):
+    return f'{table}_y{month.year}m{month.month:02d}'
+
+
+def partition_months(cursor, table=ORDERS_TABLE):
+    # {первое число месяца: имя секции} для месячных секций table
+    cursor.execute(
+        'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+        'WHERE i.inhparent = %s::regclass', [table]
+    )
+    months = {}
+    for name, in cursor.fetchall():
+        match = PARTITION_MONTH.search(name)
+        if match:
+            months[datetime.date(int(match[1]), int(match[2]), 1)] = name
+    return months
+
+
+def create_partition(cursor, month):
+    # Создаёт секцию месяца month. Заказы этого месяца, уже попавшие в секцию по умолчанию,
+    # переносятся в новую секцию: иначе присоединение секции не пройдёт проверку
+    name = partition_name(month)
+    cursor.execute(f'CREATE TABLE {name} (LIKE {ORDERS_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} '
+        f'WHERE assignment_date >= %s AND assignment_date < %s RETURNING *) '
+        f'INSERT INTO {name} SELECT * FROM moved', [month, add_months(month, 1)]
+    )
+    cursor.execute(
+        f"ALTER TABLE {ORDERS_TABLE} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+    return name
+
+
+def archive_partition(cursor, month):
+    # Переносит секцию месяца month из api_orders в архив, если в ней нет невыполненных заказов.
+    # Возвращает False, если секцию переносить нельзя
+    name = partition_name(month)
+    cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {name} WHERE complete_time IS NULL)')
+    if cursor.fetchone()[0]:
+        return False
+
+    archived = partition_name(month, ARCHIVE_TABLE)
+    cursor.execute(f'ALTER TABLE {ORDERS_TABLE} DETACH PARTITION {name}')
+    cursor.execute(f'ALTER TABLE {name} RENAME TO {archived}')
+    cursor.execute(
+        f"ALTER TABLE {ARCHIVE_TABLE} ATTACH PARTITION {archived} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+    # GET /orders/{id} перенесённых заказов больше не должен отдаваться из кэша
+    transaction.on_commit(invalidate_archived_orders)
+    return True
+
+
+def maintain_partitions(today, ahead, archive_after=None):
+    # Создаёт секции с текущего месяца на ahead месяцев вперёд и, если задан archive_after,
+    # архивирует секции месяцев, закончившихся больше archive_after месяцев назад.
+    # Каждая секция обрабатывается в своей транзакции. Возвращает (создано, архивировано)
+    current = today.replace(day=1)
+    with connection.cursor() as cursor:
+        months = partition_months(cursor)
+
+    created = 0
+    for offset in range(ahead + 1):
+        month = add_months(current, offset)
+        if month not in months:
+            with transaction.atomic(), connection.cursor() as cursor:
+                create_partition(cursor, month)
+            created += 1
+
+    archived = 0
+    if archive_after is not None:
+        cutoff = add_months(current, -archive_after)
+        for month in sorted(months):
+            if add_months(month, 1) > cutoff:
+                break
+            with transaction.atomic(), connection.cursor() as cursor:
+                archived += archive_partition(cursor, month)
+    return created, archived
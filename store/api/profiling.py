@@ -0,0 +1,107 @@
+import cProfile
+import os
+import sys
+import threading
+import uuid
+from collections import Counter
+from django.conf import settings
+from django.utils import timezone
+
+# Профилирование одного запроса по требованию: если PROFILING_ENABLED, запрос сотрудника
+# (is_staff) с заголовком X-Profile: 1 выполняется под cProfile. В PROFILING_DIR сохраняются
+# <id>.prof (для pstats / snakeviz) и <id>.folded - стеки, собранные опросом потока
+# запроса, в формате flamegraph.pl / speedscope. id возвращается в заголовке X-Profile-Id.
+# Хранятся последние PROFILING_MAX_FILES профилей
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+
+
+class StackSampler(threading.Thread):
+    # раз в interval секунд снимает стек потока thread_id
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def profile_requested(request):
+    if not settings.PROFILING_ENABLED or request.META.get(PROFILE_HEADER) != '1':
+        return False
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_staff)
+
+
+def save_profile(profile, stacks):
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    profile_id = f'{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}'
+    path = os.path.join(settings.PROFILING_DIR, profile_id)
+
+    profile.dump_stats(f'{path}.prof')
+    with open(f'{path}.folded', 'w') as file:
+        for stack, count in stacks.most_common():
+            file.write(f'{stack} {count}\n')
+
+    cleanup(settings.PROFILING_DIR, settings.PROFILING_MAX_FILES)
+    return profile_id
+
+
+def cleanup(directory, max_files):
+    # удаляет самые старые профили сверх max_files
+    profiles = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith('.prof')),
+        key=lambda entry: entry.stat().st_mtime
+    )
+    for entry in profiles[:max(len(profiles) - max_files, 0)]:
+        for path in (entry.path, entry.path[:-len('.prof')] + '.folded'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class ProfilingMiddleware:
+    # ставится после AuthenticationMiddleware: нужен request.user
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profile_requested(request):
+            return self.get_response(request)
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # в этом процессе уже работает другой профилировщик
+            return self.get_response(request)
+
+        sampler = StackSampler(threading.get_ident(), settings.PROFILING_SAMPLE_INTERVAL)
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.disable()
+            sampler.stop()
+
+        response[PROFILE_ID_HEADER] = save_profile(profile, sampler.stacks)
+        return response
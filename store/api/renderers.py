@@ -0,0 +1,48 @@
+from django.conf import settings
+from rest_framework.compat import INDENT_SEPARATORS, LONG_SEPARATORS, SHORT_SEPARATORS
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# JSON-рендерер по умолчанию: тот же вывод, что у JSONRenderer, энкодер создаётся один раз.
+# settings.API_JSON_BACKEND = 'orjson' включает orjson (если установлен). Его вывод совпадает
+# побайтно, кроме чисел с плавающей точкой в экспоненциальной записи (1e16 вместо 1e+16)
+# и NaN / Infinity, которые orjson пишет как null
+
+
+class FastJSONRenderer(JSONRenderer):
+    _encoders = {}
+
+    def get_encoder(self, indent):
+        key = (indent, self.compact, self.ensure_ascii, self.strict)
+        encoder = self._encoders.get(key)
+        if encoder is None:
+            if indent is None:
+                separators = SHORT_SEPARATORS if self.compact else LONG_SEPARATORS
+            else:
+                separators = INDENT_SEPARATORS
+            encoder = self._encoders[key] = self.encoder_class(
+                indent=indent, ensure_ascii=self.ensure_ascii,
+                allow_nan=not self.strict, separators=separators
+            )
+        return encoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        encoder = self.get_encoder(indent)
+
+        if settings.API_JSON_BACKEND == 'orjson' and orjson is not None \
+                and indent is None and self.compact and not self.ensure_ascii:
+            return orjson.dumps(
+                data, default=encoder.default,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            ).replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+        ret = encoder.encode(data)
+        return ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
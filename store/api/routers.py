@@ -0,0 +1,50 @@
+import contextvars
+import random
+from django.conf import settings
+
+# Чтение с реплик: ReplicaMiddleware помечает запросы GET / HEAD / OPTIONS, и только в них
+# ReplicaRouter отправляет чтение на одну из settings.DATABASE_REPLICAS. Запись,
+# запросы без пометки (изменяющие запросы, команды, фоновые задачи) и запросы клиента,
+# который недавно что-то изменил (кука на REPLICA_PIN_SECONDS), идут на основную базу
+
+use_replica = contextvars.ContextVar('use_replica', default=False)
+
+PIN_COOKIE = 'db_pin'
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if settings.DATABASE_REPLICAS and use_replica.get():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        read_only = request.method in READ_METHODS and PIN_COOKIE not in request.COOKIES
+        token = use_replica.set(read_only)
+        try:
+            response = self.get_response(request)
+        finally:
+            use_replica.reset(token)
+
+        if settings.DATABASE_REPLICAS and request.method not in READ_METHODS:
+            # чтение сразу после записи не должно попасть на отстающую реплику
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True)
+        return response
@@ -0,0 +1,100 @@
+import datetime
+import random
+from collections import namedtuple
+from django.db import connection, transaction
+from django.utils import timezone
+from .assignment import parse_hours
+from .cache import api_cache
+from .ingest import batches
+from .models import ArchivedOrders, CourierDailyStats, Couriers, NewOrder, Orders, hours_span
+from .services import queue_new_orders
+from .stats import rebuild_daily_stats
+
+# Синтетические курьеры и заказы для локальной базы и бенчмарков.
+# Один и тот же seed даёт одни и те же данные
+
+DEFAULT_TYPES = {'FOOT': 0.4, 'BIKE': 0.35, 'AUTO': 0.25}
+
+# Распределение интервалов: начало в [earliest, latest] часов, длина [min_length, max_length] минут
+HoursDistribution = namedtuple('HoursDistribution', ['earliest', 'latest', 'min_length', 'max_length'])
+
+DEFAULT_WORKING_HOURS = HoursDistribution(6, 14, 4 * 60, 10 * 60)
+DEFAULT_DELIVERY_HOURS = HoursDistribution(7, 20, 60, 3 * 60)
+
+
+def random_interval(rng, earliest, latest, min_length, max_length):
+    # интервал 'HH:MM-HH:MM' с началом в [earliest, latest] часов и длиной в минутах
+    start = rng.randrange(earliest * 60, latest * 60 + 1, 15)
+    end = min(start + rng.randrange(min_length, max_length + 1, 15), 23 * 60 + 59)
+    return f'{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}'
+
+
+def make_courier(rng, regions, types, hours=DEFAULT_WORKING_HOURS):
+    working_hours = sorted(random_interval(rng, *hours) for _ in range(rng.randint(1, 2)))
+    working_minutes = parse_hours(working_hours)
+    return Couriers(
+        courier_type=rng.choices(list(types), weights=list(types.values()))[0],
+        regions=sorted(rng.sample(range(1, regions + 1), rng.randint(1, min(4, regions)))),
+        working_hours=working_hours,
+        working_minutes=working_minutes,
+        working_span=hours_span(working_minutes),
+    )
+
+
+def make_order(rng, regions, hours=DEFAULT_DELIVERY_HOURS, **fields):
+    delivery_hours = sorted(random_interval(rng, *hours) for _ in range(rng.randint(1, 2)))
+    delivery_minutes = parse_hours(delivery_hours)
+    return Orders(
+        weight=round(rng.uniform(0.01, 15), 2),
+        regions=rng.randint(1, regions),
+        delivery_hours=delivery_hours,
+        delivery_minutes=delivery_minutes,
+        delivery_span=hours_span(delivery_minutes),
+        cost=rng.randrange(100, 3001, 10),
+        **fields
+    )
+
+
+def flush():
+    with connection.cursor() as cursor:
+        cursor.execute('TRUNCATE {}, {}, {}, {}, {} RESTART IDENTITY CASCADE'.format(
+            Orders._meta.db_table, ArchivedOrders._meta.db_table, NewOrder._meta.db_table,
+            CourierDailyStats._meta.db_table, Couriers._meta.db_table
+        ))
+    api_cache().clear()
+
+
+def seed(couriers, orders, regions=20, history=0, history_days=30, types=None,
+         working_hours=None, delivery_hours=None, random_seed=0, batch_size=5000):
+    # couriers - курьеры, orders - новые нераспределённые заказы,
+    # history - уже выполненные заказы за последние history_days дней
+    rng = random.Random(random_seed)
+    types = types or DEFAULT_TYPES
+    working_hours = working_hours or DEFAULT_WORKING_HOURS
+    delivery_hours = delivery_hours or DEFAULT_DELIVERY_HOURS
+
+    with transaction.atomic():
+        courier_ids = []
+        for batch in batches((make_courier(rng, regions, types, working_hours) for _ in range(couriers)), batch_size):
+            courier_ids += [courier.pk for courier in Couriers.objects.bulk_create(batch)]
+
+        for batch in batches((make_order(rng, regions, delivery_hours) for _ in range(orders)), batch_size):
+            queue_new_orders([order.pk for order in Orders.objects.bulk_create(batch)])
+
+        if history and courier_ids:
+            now = timezone.now()
+            completed = (
+                make_order(rng, regions, delivery_hours, courier_id=rng.choice(courier_ids),
+                           **_completion(rng, now, history_days))
+                for _ in range(history)
+            )
+            for batch in batches(completed, batch_size):
+                Orders.objects.bulk_create(batch)
+            rebuild_daily_stats(batch_size)
+
+    return courier_ids
+
+
+def _completion(rng, now, days):
+    complete_time = now - datetime.timedelta(minutes=rng.randrange(1, days * 24 * 60))
+    return {'assignment_date': timezone.localtime(complete_time).date(), 'complete_time': complete_time}
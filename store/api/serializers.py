@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import CHOICES, Couriers, Orders
+from .assignment import parse_hours
+from .models import CHOICES, Couriers, Orders, hours_span
 
 
 class IntegerListField(serializers.ListField):
@@ -10,6 +11,43 @@ class StringListField(serializers.ListField):
     child = serializers.CharField()
 
 
+def validate_hours(data, field):
+    # Интервалы разбираются один раз при приёме данных, 
+    # дальше распределение работает с минутами от начала суток
+    try:
+        return parse_hours(data[field])
+    except ValueError:
+        raise serializers.ValidationError({field: 'Time intervals must be in HH:MM-HH:MM format'})
+
+
+def _strings(value):
+    return [str(item) for item in value]
+
+
+class FastReadSerializer:
+    # Быстрый путь чтения: строки .values() приводятся к тому же виду, что даёт
+    # to_representation ModelSerializer, по заранее собранному списку (поле, преобразование).
+    # Экземпляры моделей и поля DRF не создаются
+
+    def __init__(self, fields):
+        self.fields = tuple(name for name, _ in fields)
+        self.converters = tuple((name, convert) for name, convert in fields if convert is not None)
+
+    def rows(self, queryset):
+        return queryset.values(*self.fields)
+
+    def to_representation(self, rows):
+        converters = self.converters
+        result = []
+        for row in rows:
+            for name, convert in converters:
+                value = row[name]
+                if value is not None:
+                    row[name] = convert(value)
+            result.append(row)
+        return result
+
+
 class CouriersSerializer(serializers.ModelSerializer):
     courier_type = serializers.ChoiceField(choices=CHOICES)
     regions = IntegerListField()
@@ -19,6 +57,12 @@ class CouriersSerializer(serializers.ModelSerializer):
         model = Couriers
         fields = ('id', 'courier_type', 'regions', 'working_hours')
 
+    def validate(self, data):
+        if 'working_hours' in data:
+            data['working_minutes'] = validate_hours(data, 'working_hours')
+            data['working_span'] = hours_span(data['working_minutes'])
+        return data
+
 class OrdersSerializer(serializers.ModelSerializer):
     delivery_hours = StringListField()
 
@@ -26,6 +70,29 @@ class OrdersSerializer(serializers.ModelSerializer):
         model = Orders
         fields = ('id', 'weight', 'regions', 'delivery_hours', 'cost')
 
+    def validate(self, data):
+        if 'delivery_hours' in data:
+            data['delivery_minutes'] = validate_hours(data, 'delivery_hours')
+            data['delivery_span'] = hours_span(data['delivery_minutes'])
+        return data
+
+class CompleteOrderListSerializer(serializers.ListSerializer):
+
+    def to_internal_value(self, data):
+        # все заказы из запроса загружаются одним запросом, 
+        # дальше каждый элемент проверяется по ним в памяти.
+        # Строки блокируются в порядке id до конца транзакции завершения: параллельное
+        # завершение того же заказа ждёт и видит уже проставленный complete_time
+        order_ids = set()
+        if isinstance(data, list):
+            for item in data:
+                try:
+                    order_ids.add(int(item['order_id']))
+                except (KeyError, TypeError, ValueError):
+                    pass
+        self.orders = Orders.objects.select_for_update().filter(pk__in=order_ids).order_by('id').in_bulk()
+        return super().to_internal_value(data)
+
 class CompleteOrderSerializer(serializers.Serializer):
     courier_id = serializers.IntegerField()
     order_id = serializers.IntegerField()
@@ -34,22 +101,34 @@ class CompleteOrderSerializer(serializers.Serializer):
     class Meta:
         model = Orders
         fields = ('id', 'weight', 'regions', 'cost', 'complete_time', 'courier')
+        list_serializer_class = CompleteOrderListSerializer
 
     def validate(self, data):
         courier_id = data.get('courier_id')
         order_id = data.get('order_id')
         complete_time = data.get('complete_time') 
 
-        try:
-            order = Orders.objects.get(pk=order_id)
-        except Orders.DoesNotExist:
+        orders = getattr(self.parent, 'orders', None)
+        if orders is not None:
+            order = orders.get(order_id)
+        else:
+            order = Orders.objects.select_for_update().filter(pk=order_id).first()
+        if order is None:
             raise serializers.ValidationError('Order does not exist')
 
         if order.courier_id is None or order.courier_id != courier_id:
             raise serializers.ValidationError('Order was not assigned to this courier')
 
         data['order'] = order
-        data['courier'] = order.courier
         data['complete_time'] = complete_time
 
-        return data
\ No newline at end of file
+        return data
+
+# То же, что CouriersSerializer / OrdersSerializer отдают при чтении
+# (regions курьера - строки: у IntegerListField дочернее поле CharField)
+COURIERS_READ = FastReadSerializer((
+    ('id', None), ('courier_type', str), ('regions', _strings), ('working_hours', _strings)
+))
+ORDERS_READ = FastReadSerializer((
+    ('id', None), ('weight', float), ('regions', int), ('delivery_hours', _strings), ('cost', int)
+))
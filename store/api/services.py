@@ -0,0 +1,218 @@
+import datetime
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.backends.postgresql.psycopg_any import NumericRange
+from .assignment import CourierRecord, OrderRecord, assign_parallel
+from .cache import invalidate_assignments, invalidate_orders
+from .capacity import CAPACITY_FIELDS, VERSION_FIELDS, eligible_couriers, take_order, touch_assignments
+from .models import Couriers, NewOrder, Orders
+
+# Операции над заказами, общие для API и фоновых задач
+
+SERIALIZATION_FAILURE = '40001'
+
+
+def run_assignment(assignment_date, progress=None, regions=None, batch_size=None, order_ids=None):
+    # Распределяет нераспределённые заказы по курьерам и возвращает content ответа
+    # POST /orders/assign. progress(stage, percent) вызывается после каждого этапа.
+    # Курьеры и заказы захватываются SELECT ... FOR UPDATE SKIP LOCKED: строки, занятые
+    # параллельным распределением, пропускаются, поэтому распределений может идти несколько.
+    # regions - распределять только заказы этих регионов (шард), batch_size - захватывать
+    # заказы пачками по id, каждая пачка распределяется и сохраняется в своей транзакции,
+    # order_ids - распределять только эти заказы
+    progress = progress or (lambda stage, percent: None)
+    assigned = {}
+
+    if batch_size is None:
+        _retrying(lambda: _assign_batch(assignment_date, assigned, regions, order_ids, None, 0, progress))
+    else:
+        total = _unassigned_orders(regions, order_ids).count() or 1
+        claimed = 0
+        after = 0
+        while after is not None:
+            after, size = _retrying(
+                lambda: _assign_batch(assignment_date, assigned, regions, order_ids, batch_size, after)
+            )
+            claimed += size
+            progress('batch', min(90, claimed * 90 // total))
+
+    return _content(assignment_date, assigned)
+
+
+def run_incremental_assignment(assignment_date, progress=None):
+    # Распределяет только заказы, созданные после прошлых инкрементальных запусков
+    # (очередь NewOrder), между курьерами их регионов. Стоимость запуска зависит от числа
+    # новых заказов, а не от всего остатка: заказы, не распределённые в своём запуске,
+    # ждут полного распределения. Заказ попадает в очередь при коммите своей транзакции,
+    # поэтому заказы долгих транзакций не теряются. Строки очереди захватываются
+    # SKIP LOCKED, параллельные запуски берут разные заказы
+    with transaction.atomic():
+        order_ids = list(
+            NewOrder.objects.select_for_update(skip_locked=True).values_list('order_id', flat=True)
+        )
+        regions = list(
+            _unassigned_orders(None, order_ids).values_list('regions', flat=True).order_by().distinct()
+        )
+        if regions:
+            content = run_assignment(assignment_date, progress, regions=regions, order_ids=order_ids)
+        else:
+            content = _content(assignment_date, {})
+
+        NewOrder.objects.filter(order_id__in=order_ids).delete()
+    return content
+
+
+def queue_new_orders(order_ids):
+    # вызывается в транзакции, создающей заказы
+    NewOrder.objects.bulk_create([NewOrder(order_id=order_id) for order_id in order_ids])
+
+
+def _content(assignment_date, assigned):
+    if type(assignment_date) == datetime.datetime:
+        assignment_date = datetime.datetime.strftime(assignment_date, '%Y-%m-%d')
+
+    return {
+        'date': assignment_date,
+        'couriers': [
+            {'courier_id': courier_id, 'orders': {'group_order_id': 1, 'orders': assigned[courier_id]}}
+            for courier_id in sorted(assigned)
+        ]
+    }
+
+
+def _unassigned_orders(regions, order_ids=None):
+    # assignment_date IS NULL оставляет в плане только секцию заказов по умолчанию
+    orders = Orders.objects.filter(
+        complete_time__isnull=True, courier__isnull=True, assignment_date__isnull=True
+    )
+    if regions is not None:
+        orders = orders.filter(regions__in=regions)
+    if order_ids is not None:
+        orders = orders.filter(id__in=order_ids)
+    return orders
+
+
+def _available_couriers(regions):
+    # возвращаем пеших курьеров, у которых меньше 2х недоставленных заказов,
+    # велокурьеров - меньше 4х, автокурьеров - меньше 7 (по индексу couriers_capacity_idx).
+    # Строки блокируются до конца транзакции, чтобы счётчики не изменились параллельным
+    # завершением заказов. Занятые строки пропускаются, блокировка не ждёт - порядок блокировки
+    # не важен, поэтому ORDER BY нет (движок сам сортирует курьеров)
+    couriers = eligible_couriers()
+    if regions is not None:
+        couriers = couriers.filter(regions__overlap=regions)
+    return couriers.select_for_update(skip_locked=True).order_by()
+
+
+def _claimable_orders(regions, order_ids, spans, batch_size, after):
+    # Заказы, интервалы доставки которых не пересекаются с рабочим временем
+    # ни одного из курьеров (spans), отсекаются по индексу на delivery_span.
+    # Пачка (batch_size) берётся по порядку id из orders_unassigned_idx
+    rows = _unassigned_orders(regions, order_ids).filter(
+        delivery_span__overlap=NumericRange(min(span.lower for span in spans),
+                                            max(span.upper for span in spans))
+    ).filter(id__gt=after).select_for_update(skip_locked=True)
+    if batch_size is None:
+        rows = rows.order_by()
+    else:
+        rows = rows.order_by('id')[:batch_size]
+    return rows.values_list('id', 'weight', 'regions', 'delivery_hours', 'delivery_minutes', 'cost')
+
+
+def _retrying(call, attempts=3):
+    # Распределённый заказ переезжает из секции по умолчанию в секцию месяца. Если параллельное
+    # распределение успело перенести строку между снимком и блокировкой, Postgres отменяет
+    # транзакцию с ошибкой сериализации - пачка повторяется
+    for attempt in range(attempts):
+        try:
+            return call()
+        except OperationalError as error:
+            if getattr(error.__cause__, 'pgcode', None) != SERIALIZATION_FAILURE or attempt == attempts - 1:
+                raise
+
+
+def _assign_batch(assignment_date, assigned, regions, order_ids, batch_size, after, progress=None):
+    # Одна транзакция распределения: заказы с id > after (пачкой не больше batch_size).
+    # Добавляет распределённые заказы в assigned: {courier_id: [заказ, ...]}.
+    # Возвращает id последнего захваченного заказа (None, если продолжать не нужно)
+    # и количество захваченных заказов
+    progress = progress or (lambda stage, percent: None)
+
+    with transaction.atomic():
+        couriers = list(_available_couriers(regions))
+        courier_records = [
+            CourierRecord(
+                courier.pk, courier.courier_type, courier.regions, courier.working_minutes,
+                courier.pending_count, courier.pending_weight, courier.pending_regions
+            )
+            for courier in couriers
+        ]
+        progress('couriers', 10)
+
+        spans = [courier.working_span for courier in couriers if courier.working_span]
+        if not spans:
+            return None, 0
+
+        orders = []
+        delivery_hours = {}
+        for pk, weight, order_region, hours, minutes, cost in _claimable_orders(
+                regions, order_ids, spans, batch_size, after):
+            orders.append(OrderRecord(pk, weight, order_region, minutes, cost))
+            delivery_hours[pk] = hours
+        progress('orders', 30)
+
+        states = assign_parallel(courier_records, orders, settings.ASSIGNMENT_WORKERS)
+        assignments = [assignment for state in states for assignment in state.assigned]
+        orders = {order.id: order for order in orders}
+        progress('assign', 70)
+
+        # записываем результат одним bulk_update
+        Orders.objects.bulk_update(
+            [Orders(pk=a.order_id, courier_id=a.courier_id, assignment_date=assignment_date, cost=a.cost)
+             for a in assignments],
+            ['courier', 'assignment_date', 'cost'],
+            batch_size=settings.ASSIGNMENT_BATCH_SIZE
+        )
+
+        # распределённые заказы больше не нужны инкрементальному распределению
+        NewOrder.objects.filter(order_id__in=[a.order_id for a in assignments]).delete()
+
+        couriers = {courier.pk: courier for courier in couriers}
+        for a in assignments:
+            take_order(couriers[a.courier_id], orders[a.order_id].weight, orders[a.order_id].regions)
+        for state in states:
+            if state.assigned:
+                touch_assignments(couriers[state.id])
+        Couriers.objects.bulk_update(
+            [couriers[state.id] for state in states if state.assigned], CAPACITY_FIELDS + VERSION_FIELDS,
+            batch_size=settings.ASSIGNMENT_BATCH_SIZE
+        )
+        progress('save', 90)
+
+        # кэш сбрасывается после коммита, иначе чтение до коммита закэширует старые строки
+        if assignments:
+            order_ids = [a.order_id for a in assignments]
+            transaction.on_commit(lambda: invalidate_assigned(assignment_date, order_ids))
+
+    for state in states:
+        if not state.assigned:
+            continue
+        assigned.setdefault(state.id, []).extend(
+            {
+                'order_id': a.order_id,
+                'weight': orders[a.order_id].weight,
+                'regions': orders[a.order_id].regions,
+                'delivery_hours': delivery_hours[a.order_id],
+                'cost': a.cost
+            }
+            for a in state.assigned
+        )
+
+    if batch_size is None or len(orders) < batch_size:
+        return None, len(orders)
+    return max(orders), len(orders)
+
+
+def invalidate_assigned(assignment_date, order_ids):
+    invalidate_orders(order_ids)
+    invalidate_assignments(assignment_date)
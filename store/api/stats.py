@@ -0,0 +1,115 @@
+import datetime
+import heapq
+from itertools import groupby
+from operator import itemgetter
+from django.db import connection
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .ingest import batches
+from .models import ArchivedOrders, CourierDailyStats, Orders
+
+# Дневная статистика курьеров (CourierDailyStats): обновление при завершении заказов
+# и чтение за период для рейтинга и заработка
+
+
+def completion_day(complete_time):
+    return timezone.localtime(complete_time).date()
+
+
+def add_completion(deltas, order, complete_time):
+    # Учитывает завершение заказа в deltas: {(courier_id, day): [количество, стоимость]}.
+    # Если заказ уже был завершён раньше, убирает его из прежнего дня
+    if order.complete_time is not None:
+        delta = deltas.setdefault((order.courier_id, completion_day(order.complete_time)), [0, 0])
+        delta[0] -= 1
+        delta[1] -= order.cost
+    delta = deltas.setdefault((order.courier_id, completion_day(complete_time)), [0, 0])
+    delta[0] += 1
+    delta[1] += order.cost
+
+
+def apply_deltas(deltas):
+    # Вызывается в той же транзакции, что и сохранение заказов.
+    # Ключи сортируются, чтобы параллельные запросы блокировали строки в одном порядке
+    for (courier_id, day), (completed_orders, orders_cost) in sorted(deltas.items()):
+        if not completed_orders and not orders_cost:
+            continue
+        stats, _ = CourierDailyStats.objects.select_for_update().get_or_create(
+            courier_id=courier_id, day=day
+        )
+        CourierDailyStats.objects.filter(pk=stats.pk).update(
+            completed_orders=F('completed_orders') + completed_orders,
+            orders_cost=F('orders_cost') + orders_cost
+        )
+
+
+def completed_stats(courier_ids, start_date, end_date):
+    # Количество и стоимость заказов, выполненных с start_date 00:00 по end_date 00:00 включительно
+    # (как complete_time__range=(start_date, end_date)): {courier_id: [количество, стоимость]}
+    result = {courier_id: [0, 0] for courier_id in courier_ids}
+    if end_date < start_date:
+        return result
+
+    boundary = [row for model in (Orders, ArchivedOrders) for row in boundary_rows(model, courier_ids, end_date)]
+    for row in list(daily_rows(courier_ids, start_date, end_date)) + boundary:
+        result[row['courier_id']][0] += row['completed_orders']
+        result[row['courier_id']][1] += row['orders_cost']
+    return result
+
+
+def daily_rows(courier_ids, start_date, end_date):
+    # по индексу courier_daily_stats_unique
+    return CourierDailyStats.objects.filter(
+        courier_id__in=courier_ids, day__gte=start_date, day__lt=end_date
+    ).values('courier_id').annotate(
+        completed_orders=Sum('completed_orders'), orders_cost=Sum('orders_cost')
+    ).order_by()
+
+
+def boundary_rows(model, courier_ids, end_date):
+    # заказы, выполненные ровно в полночь end_date, в дневную статистику за период не попадают
+    # (по индексу orders_courier_complete_idx)
+    return model.objects.filter(
+        courier_id__in=courier_ids,
+        complete_time=timezone.make_aware(datetime.datetime.combine(end_date, datetime.time()))
+    ).values('courier_id').annotate(
+        completed_orders=Count('id'), orders_cost=Sum('cost')
+    ).order_by()
+
+
+def rebuild_daily_stats(batch_size=5000):
+    # Пересчитывает статистику по таблице заказов и архиву. Вызывается внутри транзакции: 
+    # завершение заказов ждёт окончания пересчёта, чтобы не потерять обновления
+    with connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {CourierDailyStats._meta.db_table} IN EXCLUSIVE MODE')
+
+    # заказы одного дня могут лежать и в таблице, и в архиве: упорядоченные потоки
+    # сливаются и суммируются по (курьер, день)
+    sources = [
+        model.objects.filter(
+            complete_time__isnull=False
+        ).annotate(day=TruncDate('complete_time')).values('courier_id', 'day').annotate(
+            completed_orders=Count('id'), orders_cost=Sum('cost')
+        ).order_by('courier_id', 'day').iterator(chunk_size=batch_size)
+        for model in (Orders, ArchivedOrders)
+    ]
+    rows = _sum_days(heapq.merge(*sources, key=itemgetter('courier_id', 'day')))
+
+    CourierDailyStats.objects.all().delete()
+    created = 0
+    for batch in batches(rows, batch_size):
+        CourierDailyStats.objects.bulk_create([CourierDailyStats(**row) for row in batch])
+        created += len(batch)
+    return created
+
+
+def _sum_days(rows):
+    # складывает подряд идущие строки одного курьера за один день
+    for (courier_id, day), group in groupby(rows, key=itemgetter('courier_id', 'day')):
+        group = list(group)
+        yield {
+            'courier_id': courier_id, 'day': day,
+            'completed_orders': sum(row['completed_orders'] for row in group),
+            'orders_cost': sum(row['orders_cost'] for row in group)
+        }
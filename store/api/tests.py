@@ -1,3 +1,802 @@
-from django.test import TestCase
+import datetime
+import json
+import random
+import re
+import threading
+from collections import Counter
+from unittest import mock
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.backends.postgresql.psycopg_any import NumericRange
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from .assignment import COURIER_LIMITS, CourierRecord, FeasibilityIndex, OrderRecord, parse_hours
+from .assignment import assign, assign_parallel, split_by_regions
+from .cache import api_cache, cached, invalidate_orders, order_key
+from .heartbeat import Heartbeat
+from .idempotency import REPLAYED_HEADER
+from .jobs import claim_job, enqueue_assignment, run_job
+from .models import ArchivedOrders, AssignmentJob, CourierDailyStats, Couriers, IdempotencyKey, Orders, hours_span
+from .partitions import DEFAULT_PARTITION, archive_partition, create_partition, partition_name
+from .routers import use_replica
+from .stats import boundary_rows, daily_rows
+from .services import _available_couriers, _claimable_orders
+from .services import queue_new_orders, run_assignment, run_incremental_assignment
+from .views import CustomPagination
 
-# Create your tests here.
+
+class QueryIndexesTest(TestCase):
+    # Проверяет по EXPLAIN, что основные запросы эндпоинтов идут по индексам
+
+    @classmethod
+    def setUpTestData(cls):
+        # взять ещё заказы может только каждый десятый курьер, остальные загружены до лимита
+        couriers = Couriers.objects.bulk_create([
+            Couriers(courier_type=courier_type, regions=[i % 20, (i + 1) % 20],
+                     working_hours=['09:00-18:00'], working_minutes=[[540, 1080]],
+                     pending_count=0 if i % 10 == 0 else COURIER_LIMITS[courier_type].max_orders_amount)
+            for i, courier_type in ((i, ('FOOT', 'BIKE', 'AUTO')[i % 3]) for i in range(300))
+        ])
+        today = datetime.date(2023, 5, 10)
+        complete_time = timezone.make_aware(datetime.datetime(2023, 5, 10, 12, 0))
+        orders = []
+        for i in range(3000):
+            # примерно половина заказов не распределена, четверть - выполнена;
+            # интервалы доставки - по часу с 06:00 до 22:00
+            courier = couriers[i % len(couriers)] if i % 2 else None
+            start = 6 + i % 16
+            orders.append(Orders(
+                weight=1 + i % 5, regions=i % 20, delivery_hours=[f'{start:02d}:00-{start + 1:02d}:00'],
+                delivery_minutes=[[start * 60, start * 60 + 60]],
+                delivery_span=hours_span([[start * 60, start * 60 + 60]]), cost=100 + i,
+                courier=courier, assignment_date=today if courier else None,
+                complete_time=complete_time if courier and i % 4 == 1 else None
+            ))
+        Orders.objects.bulk_create(orders)
+        CourierDailyStats.objects.bulk_create([
+            CourierDailyStats(courier=courier, day=today, completed_orders=1, orders_cost=100)
+            for courier in couriers
+        ])
+        # Данные вставлены в транзакции теста, и проверки внешних ключей (DEFERRABLE INITIALLY
+        # DEFERRED) ещё стоят в очереди триггеров: с ними ALTER TABLE секции по умолчанию
+        # завершится ошибкой pending trigger events. check_constraints выполняет их сразу
+        connection.check_constraints()
+        # распределённые заказы переносятся из секции по умолчанию в секцию мая
+        with connection.cursor() as cursor:
+            create_partition(cursor, datetime.date(2023, 5, 1))
+            cursor.execute(f'ANALYZE {Couriers._meta.db_table}')
+            cursor.execute(f'ANALYZE {Orders._meta.db_table}')
+            cursor.execute(f'ANALYZE {CourierDailyStats._meta.db_table}')
+
+    def explain(self, queryset):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            return queryset.explain()
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = self.explain(queryset)
+        self.assertRegex(plan, r'Index (Only )?Scan|Bitmap Index Scan')
+        # у секционированной таблицы в плане - индексы секций, созданные по индексу таблицы
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+                'WHERE i.inhparent = %s::regclass', [index_name]
+            )
+            names = [index_name] + [name for name, in cursor.fetchall()]
+        # имя целиком: у секций есть индексы api_orders_default_id_idx и api_orders_default_id_idx1
+        self.assertTrue(any(re.search(rf'\b{re.escape(name)}\b', plan) for name in names), plan)
+
+    def test_assign_orders(self):
+        # запрос заказов распределения (services._assign_batch): пачка идёт по порядку id,
+        # без пачки заказы под рабочие часы курьеров (1/16 заказов) отбираются по delivery_span
+        spans = [NumericRange(600, 630, '[]')]
+        self.assertUsesIndex(_claimable_orders(None, None, spans, 100, 0), 'orders_unassigned_idx')
+        self.assertUsesIndex(_claimable_orders(None, None, spans, None, 0), 'orders_delivery_span_idx')
+
+    def test_assign_couriers(self):
+        # запрос курьеров распределения (services._assign_batch)
+        self.assertUsesIndex(_available_couriers(None), 'couriers_capacity_idx')
+        self.assertUsesIndex(_available_couriers([1, 2]), 'couriers_capacity_idx')
+
+    def test_assignments(self):
+        self.assertUsesIndex(
+            Orders.objects.filter(assignment_date=datetime.date(2023, 5, 10), courier__isnull=False)
+            .order_by('courier_id', 'id'),
+            'orders_assignment_date_idx'
+        )
+
+    def test_meta_info(self):
+        # запросы stats.completed_stats
+        courier_ids = list(Couriers.objects.values_list('id', flat=True)[:10])
+        self.assertUsesIndex(
+            daily_rows(courier_ids, datetime.date(2023, 5, 1), datetime.date(2023, 6, 1)),
+            'courier_daily_stats_unique'
+        )
+        self.assertUsesIndex(
+            boundary_rows(Orders, courier_ids, datetime.date(2023, 5, 11)), 'orders_courier_complete_idx'
+        )
+
+    def test_estimate_count(self):
+        # оценка складывается из статистики секций
+        self.assertEqual(CustomPagination.estimate_count(Orders), 3000)
+        self.assertEqual(CustomPagination.estimate_count(Couriers), 300)
+
+    def test_partition_pruning(self):
+        may = partition_name(datetime.date(2023, 5, 1))
+        plan = self.explain(Orders.objects.filter(
+            complete_time__isnull=True, courier__isnull=True, assignment_date__isnull=True
+        ))
+        self.assertIn(DEFAULT_PARTITION, plan)
+        self.assertNotIn(may, plan)
+
+        plan = self.explain(Orders.objects.filter(assignment_date=datetime.date(2023, 5, 10)))
+        self.assertIn(may, plan)
+        self.assertNotIn(DEFAULT_PARTITION, plan)
+
+    def test_archive_partition(self):
+        may = datetime.date(2023, 5, 1)
+        with connection.cursor() as cursor:
+            # в секции есть невыполненные заказы
+            self.assertFalse(archive_partition(cursor, may))
+
+            completed = Orders.objects.filter(assignment_date__gte=may).update(
+                complete_time=timezone.make_aware(datetime.datetime(2023, 5, 10, 18, 0))
+            )
+            # выполняет отложенные проверки внешних ключей перед ALTER TABLE (см. setUpTestData)
+            connection.check_constraints()
+            self.assertTrue(archive_partition(cursor, may))
+
+        self.assertEqual(ArchivedOrders.objects.count(), completed)
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {ArchivedOrders._meta.db_table}')
+        self.assertUsesIndex(
+            boundary_rows(ArchivedOrders, [1, 2], datetime.date(2023, 5, 11)), 'orders_archive_courier_complete_idx'
+        )
+        self.assertFalse(Orders.objects.filter(assignment_date__isnull=False).exists())
+        self.assertTrue(Orders.objects.filter(courier__isnull=True).exists())
+
+
+class ConcurrentAssignmentTest(TransactionTestCase):
+    # Несколько распределений, запущенных одновременно (в том числе по пересекающимся
+    # шардам регионов и пачками), не назначают один заказ дважды и не превышают лимиты курьеров
+
+    def setUp(self):
+        Couriers.objects.bulk_create([
+            Couriers(courier_type=('FOOT', 'BIKE', 'AUTO')[i % 3], regions=[i % 6, (i + 1) % 6],
+                     working_hours=['09:00-18:00'], working_minutes=[[540, 1080]],
+                     working_span=NumericRange(540, 1080, '[]'))
+            for i in range(60)
+        ])
+        Orders.objects.bulk_create([
+            Orders(weight=0.5 + i % 3, regions=i % 6, delivery_hours=['10:00-12:00'],
+                   delivery_minutes=[[600, 720]], delivery_span=NumericRange(600, 720, '[]'),
+                   cost=100 + i)
+            for i in range(1000)
+        ])
+
+    def test_no_double_assignment(self):
+        runs = [
+            (None, None), (None, 50), ([0, 1, 2], None), ([3, 4, 5], 25),
+            ([1, 4], 10), ([2, 3], None), (None, 100), ([0, 5], 50),
+        ]
+        barrier = threading.Barrier(len(runs))
+        results, errors = [], []
+
+        def run(regions, batch_size):
+            try:
+                barrier.wait()
+                results.append(run_assignment('2023-05-10', regions=regions, batch_size=batch_size))
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=args) for args in runs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+        assigned = [
+            (order['order_id'], courier['courier_id'])
+            for result in results for courier in result['couriers'] for order in courier['orders']['orders']
+        ]
+        self.assertTrue(assigned)
+        order_ids = [order_id for order_id, _ in assigned]
+        self.assertEqual(len(order_ids), len(set(order_ids)))
+        self.assertEqual(
+            dict(assigned),
+            dict(Orders.objects.filter(courier__isnull=False).values_list('id', 'courier_id'))
+        )
+
+        pending = Counter(courier_id for _, courier_id in assigned)
+        for courier in Couriers.objects.all():
+            self.assertEqual(courier.pending_count, pending[courier.pk])
+            self.assertLessEqual(courier.pending_count, COURIER_LIMITS[courier.courier_type].max_orders_amount)
+
+
+class ConcurrentCompletionTest(TransactionTestCase):
+    # Одновременные завершения одного заказа (повтор клиента) освобождают место у курьера
+    # и попадают в дневную статистику один раз
+
+    def setUp(self):
+        cache.clear()
+        self.courier = Couriers.objects.create(
+            courier_type='BIKE', regions=[1, 2], working_hours=['09:00-18:00'],
+            working_minutes=[[540, 1080]], pending_count=2, pending_weight=5, pending_regions=[1, 2]
+        )
+        self.orders = Orders.objects.bulk_create([
+            Orders(weight=weight, regions=region, delivery_hours=['10:00-12:00'],
+                   delivery_minutes=[[600, 720]], cost=100 * region, courier=self.courier,
+                   assignment_date=datetime.date(2023, 5, 10))
+            for weight, region in ((2, 1), (3, 2))
+        ])
+
+    def test_complete_same_order(self):
+        body = {'content': {'complete_info': [{
+            'courier_id': self.courier.pk, 'order_id': self.orders[0].pk,
+            'complete_time': '2023-05-10T12:00:00Z'
+        }]}}
+        barrier = threading.Barrier(2)
+        statuses = []
+        errors = []
+
+        def run():
+            try:
+                client = APIClient()
+                barrier.wait()
+                statuses.append(client.post('/orders/complete/', body, format='json').status_code)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(statuses, [200, 200])
+
+        courier = Couriers.objects.get(pk=self.courier.pk)
+        self.assertEqual(courier.pending_count, 1)
+        self.assertEqual(courier.pending_weight, 3)
+        self.assertEqual(courier.pending_regions, [2])
+        stats = CourierDailyStats.objects.get(courier=courier)
+        self.assertEqual((stats.completed_orders, stats.orders_cost), (1, 100))
+
+
+class AssignmentsConditionalTest(TestCase):
+    # ETag / Last-Modified GET /couriers/assignments соответствуют именно отданному ответу
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.courier = Couriers.objects.create(
+            courier_type='AUTO', regions=[1], working_hours=['09:00-18:00'], working_minutes=[[540, 1080]],
+            assignment_version=1, assignments_updated_at=timezone.now() - datetime.timedelta(hours=1)
+        )
+        Orders.objects.bulk_create([
+            Orders(weight=1, regions=1, delivery_hours=['10:00-12:00'], delivery_minutes=[[600, 720]],
+                   cost=100, courier=self.courier, assignment_date=day)
+            for day in (datetime.date(2023, 5, 10), datetime.date(2023, 5, 11))
+        ])
+
+    def get(self, **params):
+        headers = {key: params.pop(key) for key in list(params) if key.startswith('HTTP_')}
+        return self.client.get('/couriers/assignments/', {'courier_id': self.courier.pk, **params}, **headers)
+
+    def test_etag_depends_on_date_and_page(self):
+        first = self.get(date='2023-05-10')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(self.get(date='2023-05-10', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        other_day = self.get(date='2023-05-11', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(other_day.status_code, 200)
+        self.assertEqual(other_day.data['content']['date'], '2023-05-11')
+        self.assertNotEqual(other_day['ETag'], first['ETag'])
+        self.assertEqual(self.get(date='2023-05-10', limit=5, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_last_modified_only_with_explicit_date(self):
+        with_date = self.get(date='2023-05-10')
+        self.assertIn('Last-Modified', with_date)
+
+        today = self.get()
+        self.assertNotIn('Last-Modified', today)
+        self.assertIn(str(datetime.date.today()), today['ETag'])
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=with_date['Last-Modified']).status_code, 200)
+
+
+def random_hours(rng, count):
+    # интервалы 'HH:MM-HH:MM', часть из них переходит через полночь ('22:00-01:30')
+    hours = []
+    for _ in range(count):
+        start = rng.randrange(0, 24 * 60, 30)
+        end = (start + rng.randrange(30, 8 * 60, 30)) % (24 * 60)
+        hours.append(f'{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}')
+    return hours
+
+
+def random_problem(rng, couriers_amount, orders_amount, regions):
+    # Курьеры с недоставленными заказами (в том числе заполненные по количеству и регионам)
+    # и заказы в строковом виде: (id, тип, регионы, working_hours, [(вес, регион), ...])
+    # и (id, вес, регион, delivery_hours, стоимость)
+    couriers = []
+    for courier_id in range(1, couriers_amount + 1):
+        courier_type = rng.choice(('FOOT', 'BIKE', 'AUTO'))
+        limits = COURIER_LIMITS[courier_type]
+        courier_regions = rng.sample(range(1, regions + 1), rng.randint(1, min(4, regions)))
+        pending = [(round(rng.uniform(0.5, 6), 2), rng.choice(courier_regions))
+                   for _ in range(rng.randint(0, limits.max_orders_amount))]
+        couriers.append((courier_id, courier_type, courier_regions,
+                         random_hours(rng, rng.randint(0, 2)), pending))
+    orders = [(order_id, round(rng.uniform(0.5, 12), 2), rng.randint(1, regions),
+               random_hours(rng, rng.randint(1, 2)), rng.randrange(100, 3001, 10))
+              for order_id in range(1, orders_amount + 1)]
+    return couriers, orders
+
+
+def courier_records(couriers):
+    return [CourierRecord(courier_id, courier_type, courier_regions, parse_hours(working_hours),
+                          len(pending), sum(weight for weight, region in pending),
+                          [region for weight, region in pending])
+            for courier_id, courier_type, courier_regions, working_hours, pending in couriers]
+
+
+def order_records(orders):
+    return [OrderRecord(order_id, weight, region, parse_hours(delivery_hours), cost)
+            for order_id, weight, region, delivery_hours, cost in orders]
+
+
+def assignments(states):
+    return sorted((a.courier_id, a.order_id, a.cost) for state in states for a in state.assigned)
+
+
+def old_assign(couriers, orders):
+    # Перенос цикла прежнего StoreViewSet.assign_orders без обращений к БД: интервалы 
+    # разбираются в datetime за одну дату, курьеры отбираются по типу и количеству 
+    # недоставленных заказов, каждый проходит по всем заказам в порядке интервалов доставки
+    day = '2023-05-10'
+    parse = lambda hours: [[datetime.datetime.strptime(f'{day} {t}', '%Y-%m-%d %H:%M')
+                            for t in interval.split('-')] for interval in hours]
+
+    def overlap(working_hours, delivery_hours, limit):
+        for delivery_interval in delivery_hours:
+            for working_interval in working_hours:
+                if working_interval[0] <= delivery_interval[0] <= delivery_interval[1] <= working_interval[1]:
+                    return True
+                elif working_interval[0] <= delivery_interval[0] <= working_interval[1] \
+                        and (working_interval[1] - delivery_interval[0]).seconds / 60 >= limit:
+                    return True
+                elif delivery_interval[0] <= working_interval[0] <= delivery_interval[1] \
+                        and (delivery_interval[1] - working_interval[0]).seconds / 60 >= limit:
+                    return True
+                elif delivery_interval[0] <= working_interval[1] <= delivery_interval[1] \
+                        and (delivery_interval[1] - working_interval[1]).seconds / 60 >= limit:
+                    return True
+        return False
+
+    def get_limit(limits, order, courier_regions, pending):
+        if len(pending) < limits.max_orders_amount \
+                and (sum([weight for weight, region in pending]) + order[1]) <= limits.max_carriable_weight \
+                and order[2] in courier_regions:
+            pending_regions = {region for weight, region in pending}
+            regions_amount = len(pending_regions | {order[2]})
+            if regions_amount <= limits.max_regions_amount:
+                if order[2] not in pending_regions:
+                    limit = regions_amount * limits.first_order_in_region_time \
+                        + (len(pending) - regions_amount + 1) * limits.subsequent_orders_in_region_time
+                    return limit, 1
+                limit = regions_amount * limits.first_order_in_region_time \
+                    + (len(pending) - regions_amount) * limits.subsequent_orders_in_region_time
+                return limit, 0.8
+        return False, None
+
+    delivery_hours = {order[0]: parse(order[3]) for order in orders}
+    orders = sorted(orders, key=lambda order: delivery_hours[order[0]])
+    taken = set()
+    result = []
+    for courier_type in ('FOOT', 'BIKE', 'AUTO'):
+        limits = COURIER_LIMITS[courier_type]
+        for courier_id, type_, courier_regions, working_hours, pending in couriers:
+            if type_ != courier_type or len(pending) >= limits.max_orders_amount:
+                continue
+            pending = list(pending)
+            working_hours = parse(working_hours)
+            for order in orders:
+                if order[0] in taken:
+                    continue
+                limit, coefficient = get_limit(limits, order, courier_regions, pending)
+                if limit and overlap(working_hours, delivery_hours[order[0]], limit):
+                    taken.add(order[0])
+                    pending.append((order[1], order[2]))
+                    result.append((courier_id, order[0], int(order[4] * coefficient)))
+    return sorted(result)
+
+
+class GreedyEquivalenceTest(SimpleTestCase):
+    # assign() повторяет назначения и стоимости прежнего цикла из views.py
+
+    def test_random_cases(self):
+        rng = random.Random(1)
+        for case in range(400):
+            couriers, orders = random_problem(rng, rng.randint(1, 12), rng.randint(0, 40), rng.randint(1, 5))
+            with self.subTest(case=case):
+                expected = old_assign(couriers, orders)
+                self.assertEqual(assignments(assign(courier_records(couriers), order_records(orders),
+                                                   vectorize=False)), expected)
+
+
+class VectorizedAssignmentTest(SimpleTestCase):
+    # Векторизованный отбор кандидатов даёт те же назначения, что и построчный.
+    # С маленькими пачками регионы курьеров сливаются за много шагов по границе просмотра
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if FeasibilityIndex is None:
+            raise cls.skipException('numpy is not installed')
+
+    def test_matches_row_by_row(self):
+        rng = random.Random(2)
+        for case in range(200):
+            couriers, orders = random_problem(rng, rng.randint(1, 12), rng.randint(0, 60), rng.randint(1, 4))
+            couriers, orders = courier_records(couriers), order_records(orders)
+            for chunk_size in (1, 2, 3, 4096):
+                with self.subTest(case=case, chunk_size=chunk_size), \
+                        mock.patch('api.feasibility.CHUNK_SIZE', chunk_size):
+                    self.assertEqual(assignments(assign(couriers, orders, vectorize=True)),
+                                     assignments(assign(couriers, orders, vectorize=False)))
+
+
+class ParallelAssignmentTest(SimpleTestCase):
+    # Распределение по компонентам регионов в нескольких процессах совпадает с общим
+
+    def components(self, rng, amount):
+        # amount независимых групп: регионы группы k - 10 * k + 1 ... 10 * k + 3
+        couriers, orders = [], []
+        for k in range(amount):
+            group_couriers, group_orders = random_problem(rng, rng.randint(1, 6), rng.randint(0, 30), 3)
+            for courier_id, courier_type, regions, working_hours, pending in group_couriers:
+                couriers.append((len(couriers) + 1, courier_type, [10 * k + r for r in regions],
+                                 working_hours, [(weight, 10 * k + r) for weight, r in pending]))
+            for order_id, weight, region, delivery_hours, cost in group_orders:
+                orders.append((len(orders) + 1, weight, 10 * k + region, delivery_hours, cost))
+        rng.shuffle(couriers)
+        rng.shuffle(orders)
+        return courier_records(couriers), order_records(orders)
+
+    def test_matches_sequential(self):
+        rng = random.Random(3)
+        for case in range(10):
+            couriers, orders = self.components(rng, rng.randint(2, 6))
+            with self.subTest(case=case):
+                expected = assign(couriers, orders)
+                states = assign_parallel(couriers, orders, workers=3)
+                self.assertEqual([state.id for state in states], [state.id for state in expected])
+                self.assertEqual(assignments(states), assignments(expected))
+
+    def test_split_drops_unserved_regions(self):
+        couriers = courier_records([
+            (1, 'FOOT', [1, 2], ['10:00-12:00'], []),
+            (2, 'BIKE', [2, 3], ['10:00-12:00'], []),
+            (3, 'AUTO', [5], ['10:00-12:00'], []),
+            (4, 'AUTO', [7], ['10:00-12:00'], []),
+        ])
+        orders = order_records([
+            (1, 1, 1, ['10:00-11:00'], 100),
+            (2, 1, 3, ['10:00-11:00'], 100),
+            (3, 1, 4, ['10:00-11:00'], 100),
+            (4, 1, 5, ['10:00-11:00'], 100),
+            (5, 1, 6, ['10:00-11:00'], 100),
+        ])
+        components = split_by_regions(couriers, orders)
+        # регионы 4 и 6 никто не обслуживает, у курьера 4 нет заказов
+        self.assertEqual(
+            sorted((sorted(c.id for c in part[0]), sorted(o.id for o in part[1])) for part in components),
+            [([1, 2], [1, 2]), ([3], [4])]
+        )
+        states = assign_parallel(couriers, orders, workers=3)
+        self.assertEqual([state.id for state in states], [1, 2, 3, 4])
+        self.assertEqual(assignments(states), assignments(assign(couriers, orders)))
+
+
+class CachedReadsTest(SimpleTestCase):
+    # записи кэша строятся чтением с основной базы, даже в запросе, читающем с реплик
+
+    def test_build_reads_primary(self):
+        api_cache().clear()
+        token = use_replica.set(True)
+        try:
+            self.assertIs(cached('replica-test', use_replica.get), False)
+            self.assertIs(use_replica.get(), True)
+        finally:
+            use_replica.reset(token)
+
+
+class AssignmentJobLeaseTest(TestCase):
+    # Задача упавшего обработчика не занимает свою дату навсегда
+
+    def setUp(self):
+        long_ago = timezone.now() - datetime.timedelta(hours=1)
+        self.dead = AssignmentJob.objects.create(
+            assignment_date=datetime.date(2023, 5, 10), status='running',
+            started_at=long_ago, heartbeat_at=long_ago
+        )
+
+    def test_enqueue_replaces_dead_job(self):
+        job = enqueue_assignment(datetime.date(2023, 5, 10))
+        self.assertNotEqual(job.pk, self.dead.pk)
+        self.assertEqual(job.status, 'queued')
+        self.dead.refresh_from_db()
+        self.assertEqual(self.dead.status, 'failed')
+
+    def test_live_job_is_kept(self):
+        AssignmentJob.objects.filter(pk=self.dead.pk).update(heartbeat_at=timezone.now())
+        self.assertEqual(enqueue_assignment(datetime.date(2023, 5, 10)).pk, self.dead.pk)
+        self.assertIsNone(claim_job())
+        self.dead.refresh_from_db()
+        self.assertEqual(self.dead.status, 'running')
+
+
+class HeartbeatTest(SimpleTestCase):
+
+    def test_wake(self):
+        # wake() отмечает сразу, не дожидаясь интервала; после stop() отметок нет
+        beats = threading.Semaphore(0)
+        heartbeat = Heartbeat(beats.release, 60)
+        heartbeat.start()
+        heartbeat.wake()
+        self.assertTrue(beats.acquire(timeout=5))
+        heartbeat.stop()
+        self.assertFalse(heartbeat.is_alive())
+        self.assertFalse(beats.acquire(timeout=0))
+
+
+class AssignmentJobParamsTest(TestCase):
+    # Фоновое распределение выполняется с параметрами запроса
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        Couriers.objects.create(
+            courier_type='AUTO', regions=[1, 2], working_hours=['09:00-18:00'],
+            working_minutes=[[540, 1080]], working_span=NumericRange(540, 1080, '[]')
+        )
+        self.orders = [
+            Orders.objects.create(
+                weight=1, regions=region, delivery_hours=['10:00-12:00'], delivery_minutes=[[600, 720]],
+                delivery_span=NumericRange(600, 720, '[]'), cost=100
+            )
+            for region in (1, 2)
+        ]
+
+    def post(self, query):
+        return self.client.post(f'/orders/assign/?date=2023-05-10&async=1&{query}')
+
+    def test_params_are_kept(self):
+        response = self.post('regions=2&regions=1&batch_size=5')
+        self.assertEqual(response.status_code, 202)
+        job = AssignmentJob.objects.get()
+        self.assertEqual((job.regions, job.batch_size), ([1, 2], 5))
+        self.assertEqual(self.post('regions=1&regions=2&batch_size=5').status_code, 202)
+        # за дату уже стоит задача с другими параметрами
+        self.assertEqual(self.post('regions=1').status_code, 409)
+        self.assertEqual(self.post('incremental=1').status_code, 400)
+        self.assertEqual(AssignmentJob.objects.count(), 1)
+
+    def test_run_job_uses_params(self):
+        job = enqueue_assignment(datetime.date(2023, 5, 10), regions=[2], batch_size=None)
+        job = run_job(claim_job())
+        self.assertEqual((job.status, job.stage, job.progress), ('done', 'done', 100))
+        self.assertEqual(
+            list(Orders.objects.filter(courier__isnull=False).values_list('id', flat=True)), [self.orders[1].pk]
+        )
+
+
+class CursorPaginationTest(TestCase):
+    # ?after= - курсор по id: некорректный курсор - 400, а не первая страница
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.couriers = [
+            Couriers.objects.create(courier_type='FOOT', regions=[1], working_hours=['09:00-18:00'])
+            for _ in range(3)
+        ]
+
+    def test_pages(self):
+        response = self.client.get('/couriers/', {'limit': 2, 'after': self.couriers[0].pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([courier['id'] for courier in response.data['couriers']],
+                         [courier.pk for courier in self.couriers[1:]])
+
+    def test_invalid_after(self):
+        for after in ('abc', '-1', ''):
+            with self.subTest(after=after):
+                response = self.client.get('/couriers/', {'limit': 2, 'after': after})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('after', response.data)
+
+
+class OrderCacheTest(TestCase):
+    # GET /orders/{id} из кэша: запись, построенная до изменения заказа, после него не отдаётся
+
+    def setUp(self):
+        cache.clear()
+        api_cache().clear()
+        self.client = APIClient()
+        courier = Couriers.objects.create(courier_type='AUTO', regions=[1], working_hours=['09:00-18:00'])
+        self.order = Orders.objects.create(
+            weight=1, regions=1, delivery_hours=['10:00-12:00'], cost=100, courier=courier,
+            assignment_date=datetime.date(2023, 5, 10),
+            complete_time=timezone.make_aware(datetime.datetime(2023, 5, 10, 12, 0))
+        )
+
+    def get(self):
+        return self.client.get(f'/orders/{self.order.pk}/')
+
+    def test_stale_write_back(self):
+        self.assertEqual(self.get().data['content']['cost'], 100)
+        # запрос прочитал версию и строку до распределения, а сохранил запись после сброса
+        key = order_key(self.order.pk)
+        Orders.objects.filter(pk=self.order.pk).update(cost=80)
+        invalidate_orders([self.order.pk])
+        api_cache().set(key, {'cost': 100})
+        self.assertEqual(self.get().data['content']['cost'], 80)
+
+    def test_archived_order(self):
+        self.assertEqual(self.get().status_code, 200)
+        connection.check_constraints()
+        with connection.cursor() as cursor, self.captureOnCommitCallbacks(execute=True):
+            create_partition(cursor, datetime.date(2023, 5, 1))
+            self.assertTrue(archive_partition(cursor, datetime.date(2023, 5, 1)))
+        self.assertEqual(self.get().status_code, 404)
+
+
+class IncrementalAssignmentTest(TestCase):
+    # Заказ, id которого выдан раньше, а транзакция закоммичена позже, не теряется
+
+    def setUp(self):
+        Couriers.objects.create(
+            courier_type='AUTO', regions=[1], working_hours=['09:00-18:00'],
+            working_minutes=[[540, 1080]], working_span=NumericRange(540, 1080, '[]')
+        )
+
+    def order(self):
+        return Orders.objects.create(
+            weight=1, regions=1, delivery_hours=['10:00-12:00'], delivery_minutes=[[600, 720]],
+            delivery_span=NumericRange(600, 720, '[]'), cost=100
+        )
+
+    def assigned(self, content):
+        return [order['order_id'] for courier in content['couriers'] for order in courier['orders']['orders']]
+
+    def test_late_commit(self):
+        late, early = self.order(), self.order()
+        queue_new_orders([early.pk])
+        self.assertEqual(self.assigned(run_incremental_assignment('2023-05-10')), [early.pk])
+
+        # транзакция заказа с меньшим id закоммичена после распределения
+        queue_new_orders([late.pk])
+        self.assertEqual(self.assigned(run_incremental_assignment('2023-05-10')), [late.pk])
+        self.assertEqual(self.assigned(run_incremental_assignment('2023-05-10')), [])
+
+
+class BulkIngestTest(TestCase):
+    # POST /orders/bulk: пачки, номера ошибок по всему телу, откат и NDJSON
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def order(self, cost=100):
+        return {'weight': 1.5, 'regions': 1, 'delivery_hours': ['10:00-12:00'], 'cost': cost}
+
+    def post_json(self, orders, batch_size=2):
+        return self.client.post(f'/orders/bulk/?batch_size={batch_size}',
+                                {'content': {'orders': orders}}, format='json')
+
+    def post_ndjson(self, lines, batch_size=2, **extra):
+        body = ''.join(line + '\n' for line in lines).encode()
+        return self.client.generic('POST', f'/orders/bulk/?batch_size={batch_size}', body,
+                                   content_type='application/x-ndjson', **extra)
+
+    def test_batches(self):
+        response = self.post_json([self.order(cost) for cost in range(100, 105)])
+        self.assertEqual(response.status_code, 200)
+        ids = [item['id'] for item in response.data['orders']]
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(list(Orders.objects.filter(id__in=ids).order_by('id').values_list('cost', flat=True)),
+                         list(range(100, 105)))
+
+    def test_errors_across_batches_roll_back(self):
+        orders = [self.order() for _ in range(6)]
+        orders[1]['weight'] = 'heavy'
+        # ошибка в последней пачке, после сохранения первых
+        orders[5]['delivery_hours'] = ['25:00-26:00']
+        response = self.post_json(orders)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sorted(int(index) for index in response.data['errors']), [1, 5])
+
+        orders[1]['weight'] = 1
+        response = self.post_json(orders)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.data['errors']), [5])
+        self.assertFalse(Orders.objects.exists())
+
+    def test_ndjson(self):
+        response = self.post_ndjson([json.dumps(self.order(cost)) for cost in range(100, 103)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['orders']), 3)
+        self.assertEqual(Orders.objects.count(), 3)
+
+    def test_ndjson_parse_error(self):
+        response = self.post_ndjson([json.dumps(self.order()), json.dumps(self.order()), '{"weight": '])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Orders.objects.exists())
+
+    def test_ndjson_without_length(self):
+        response = self.post_ndjson([json.dumps(self.order())], CONTENT_LENGTH='')
+        self.assertEqual(response.status_code, 411)
+        self.assertFalse(Orders.objects.exists())
+
+
+class IdempotencyTest(TestCase):
+    # Повтор POST с тем же Idempotency-Key отдаёт сохранённый ответ и не создаёт объекты заново
+
+    def setUp(self):
+        # счётчики ограничения частоты запросов лежат в кэше
+        cache.clear()
+        self.client = APIClient()
+        self.body = {'content': {'couriers': [
+            {'courier_type': 'FOOT', 'regions': [1, 2], 'working_hours': ['09:00-18:00']}
+        ]}}
+
+    def post(self, body, key='retry-1'):
+        return self.client.post('/couriers/', body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay(self):
+        first = self.post(self.body)
+        retry = self.post(self.body)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry['Content-Type'], first['Content-Type'])
+        self.assertEqual(retry[REPLAYED_HEADER], 'true')
+        self.assertEqual(Couriers.objects.count(), 1)
+
+        self.assertEqual(self.post(self.body, key='retry-2').status_code, 200)
+        self.assertEqual(Couriers.objects.count(), 2)
+
+    def test_different_body(self):
+        self.post(self.body)
+        self.body['content']['couriers'][0]['regions'] = [3]
+        self.assertEqual(self.post(self.body).status_code, 422)
+        self.assertEqual(Couriers.objects.count(), 1)
+
+    def test_in_progress(self):
+        # запрос идёт дольше IDEMPOTENCY_PROCESSING_TIMEOUT, но отмечается
+        record = IdempotencyKey.objects.create(scope='couriers.create', key='retry-1', request_hash='')
+        IdempotencyKey.objects.filter(pk=record.pk).update(
+            created_at=timezone.now() - datetime.timedelta(hours=1)
+        )
+        self.assertEqual(self.post(self.body).status_code, 409)
+        self.assertEqual(Couriers.objects.count(), 0)
+
+    def test_abandoned_claim(self):
+        IdempotencyKey.objects.create(
+            scope='couriers.create', key='retry-1', request_hash='',
+            heartbeat_at=timezone.now() - datetime.timedelta(hours=1)
+        )
+        self.assertEqual(self.post(self.body).status_code, 200)
+        self.assertEqual(Couriers.objects.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 200)
+
+    def test_failed_request_releases_key(self):
+        self.body['content']['couriers'][0]['courier_type'] = 'BOAT'
+        self.assertEqual(self.post(self.body).status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
@@ -1,18 +1,109 @@
 import datetime
-from django.db.models import Q, Count
+from itertools import groupby
+from operator import itemgetter
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.response import Response
-from .models import Couriers, Orders
-from .serializers import CouriersSerializer, OrdersSerializer, CompleteOrderSerializer
+from rest_framework.utils.urls import replace_query_param
+from .cache import assignments_key, cached, courier_key, order_key
+from .capacity import CAPACITY_FIELDS, VERSION_FIELDS, lock_couriers, release_order, touch_assignments
+from .export import EXPORT_CONTENT_TYPES, export_lines, export_queryset
+from .idempotency import idempotent
+from .ingest import bulk_ingest, iter_ndjson
+from .jobs import enqueue_assignment, job_status, same_params
+from .models import AssignmentJob, Couriers, Orders
+from .serializers import COURIERS_READ, ORDERS_READ, CouriersSerializer, OrdersSerializer, CompleteOrderSerializer
+from .services import queue_new_orders, run_assignment, run_incremental_assignment
+from .stats import add_completion, apply_deltas, completed_stats
+
+RATING_COEFS = {'FOOT':3 , 'BIKE':2, 'AUTO':1}
+EARNINGS_COEFS = {'FOOT':2 , 'BIKE':3, 'AUTO':4}
 
 class CustomPagination(LimitOffsetPagination):
     default_limit = 1
     default_offset = 0
     field = 'field'
 
+    # Курсорный режим: включается параметром ?after=<id> (after=0 - первая страница).
+    # Страницы выбираются по индексу на id без OFFSET, поэтому дальние страницы стоят 
+    # столько же, сколько первая. COUNT(*) не считается: ?count=estimate вернёт оценку 
+    # по статистике Postgres, ?count=exact - точное число
+    after_query_param = 'after'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.after = None
+        if self.after_query_param not in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.limit = self.get_limit(request)
+        try:
+            self.after = int(request.query_params[self.after_query_param])
+        except ValueError:
+            self.after = -1
+        if self.after < 0:
+            # иначе клиент молча получил бы первую страницу ещё раз
+            raise ValidationError({self.after_query_param: 'A non-negative integer is required'})
+
+        count_mode = request.query_params.get(self.count_query_param)
+        if count_mode == 'exact':
+            self.count = self.get_count(queryset)
+        elif count_mode == 'estimate':
+            self.count = self.estimate_count(queryset.model)
+        else:
+            self.count = None
+
+        page = list(queryset.filter(pk__gt=self.after).order_by('pk')[:self.limit + 1])
+        self.has_next = len(page) > self.limit
+        page = page[:self.limit]
+        if page:
+            # строки быстрого пути чтения (StoreViewSet.list) - словари
+            self.last_id = page[-1]['id'] if isinstance(page[-1], dict) else page[-1].pk
+        else:
+            self.last_id = None
+        return page
+
+    @staticmethod
+    def estimate_count(model):
+        # у секционированной таблицы (заказы) статистика есть только у секций:
+        # родительскую таблицу autovacuum не анализирует
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass AND relkind <> 'p' "
+                "UNION ALL SELECT c.reltuples FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = %s::regclass", [table, table]
+            )
+            # -1 - таблица ещё ни разу не анализировалась
+            counts = [count for count, in cursor.fetchall() if count >= 0]
+        return int(sum(counts)) if counts else None
+
+    def get_next_after_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.after_query_param, self.last_id)
+
     def get_paginated_response(self, data, field):
+        if self.after is not None:
+            result = {
+                'count': self.count,
+                'next': self.get_next_after_link(),
+                'after': self.after,
+                'limit': self.limit,
+                field: data
+            }
+            return Response(result)
+
         result = {
                 'count': self.count,
                 'next': self.get_next_link(),
@@ -32,15 +123,94 @@ class OrdersPagination(CustomPagination):
     def get_paginated_response(self, data):
         return super().get_paginated_response(data, field='orders')
 
+class MetaInfoPagination(CouriersPagination):
+    default_limit = 100
+    max_limit = 1000
+
 class StoreViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, 
                      mixins.ListModelMixin, viewsets.GenericViewSet):
-    pass
+    # ключ, под которым лежат объекты в теле запроса и ответа: 'couriers' / 'orders'
+    content_field = None
+    # быстрый путь чтения для list (serializers.FastReadSerializer)
+    read_serializer = None
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.read_serializer.rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.read_serializer.to_representation(page))
+        return Response(self.read_serializer.to_representation(queryset))
+
+    def on_saved(self, objects):
+        # вызывается в транзакции, создающей объекты (create, bulk)
+        pass
+
+    @action(detail=False, methods=['POST'], url_path='bulk')
+    @idempotent
+    def bulk_ingest(self, request):
+        # Тело - JSON как у обычного create или NDJSON (один объект на строку),
+        # который читается потоково
+        try:
+            batch_size = int(request.query_params.get('batch_size', settings.BULK_INGEST_BATCH_SIZE))
+        except ValueError:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        if batch_size <= 0:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        if request.content_type.startswith('application/x-ndjson'):
+            # без Content-Length (chunked) DRF не отдаёт тело (request.stream = None):
+            # загрузка молча оказалась бы пустой
+            if not request.META.get('CONTENT_LENGTH'):
+                return Response(status=status.HTTP_411_LENGTH_REQUIRED)
+            items = iter_ndjson(request.stream or [])
+        else:
+            items = request.data['content'][self.content_field]
+
+        try:
+            ids, errors = bulk_ingest(self.serializer_class, items, batch_size, self.on_saved)
+        except ValueError:
+            # некорректная строка NDJSON
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({self.content_field: [{'id': pk} for pk in ids]}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['GET'], url_path='export')
+    def export(self, request):
+        # Полная выгрузка потоком: ?output=csv|ndjson (не ?format - он занят DRF), 
+        # фильтры ?startDate=&endDate= (дата распределения), ?courier_id= (можно несколько),
+        # ?status=completed|pending|unassigned
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_CONTENT_TYPES:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        try:
+            queryset = export_queryset(
+                self.content_field,
+                start_date=request.query_params.get('startDate'),
+                end_date=request.query_params.get('endDate'),
+                courier_ids=[int(pk) for pk in request.query_params.getlist('courier_id')],
+                status=request.query_params.get('status'),
+            )
+        except ValueError:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(
+            export_lines(self.content_field, queryset, output, settings.EXPORT_CHUNK_SIZE),
+            content_type=EXPORT_CONTENT_TYPES[output]
+        )
+        response['Content-Disposition'] = f'attachment; filename="{self.content_field}.{output}"'
+        return response
 
 class CouriersViewSet(StoreViewSet):
     queryset = Couriers.objects.all()
     serializer_class = CouriersSerializer
+    read_serializer = COURIERS_READ
     pagination_class = CouriersPagination
+    content_field = 'couriers'
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         serializer = CouriersSerializer(data=request.data['content']['couriers'], many=True)
         serializer.is_valid(raise_exception=True)
@@ -52,11 +222,34 @@ class CouriersViewSet(StoreViewSet):
 
         return Response(response_data, status=status.HTTP_200_OK)
 
-
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        return Response({'content': serializer.data})
+        content = cached(courier_key(kwargs['pk']), lambda: dict(self.get_serializer(self.get_object()).data))
+        return Response({'content': content})
+
+    @staticmethod
+    def meta_info(courier, completed_orders, orders_cost, rating_period):
+        # расчёт рейтинга
+        rating = (
+            (completed_orders/(rating_period.days*24)) * RATING_COEFS[courier.courier_type]
+        )
+
+        # расчет заработка
+        earnings = (orders_cost or 0) * EARNINGS_COEFS[courier.courier_type]
+
+        content = {
+            'courier_id': courier.id,
+            'courier_type':courier.courier_type,
+            'regions':courier.regions,
+            'working_hours':courier.working_hours
+        }
+
+        if rating:
+            content['rating'] = rating
+
+        if earnings:
+            content['earnings'] = earnings
+
+        return content
 
     @action(detail=True, methods=['GET'], url_path='meta-info/<int:courier_id>')    
     def get_meta_info(self, request, courier_id):
@@ -70,99 +263,173 @@ class CouriersViewSet(StoreViewSet):
         except:
             return Response(status=status.HTTP_404_NOT_FOUND)
         
-        orders = courier.orders.filter(
-            complete_time__range=(start_date, end_date)
-            )
-        
-        # расчёт рейтинга
         start_date = datetime.datetime.strptime(start_date, '%Y-%m-%d')
         end_date = datetime.datetime.strptime(end_date, '%Y-%m-%d')
         rating_period = end_date-start_date
-        rating_coefs = {'FOOT':3 , 'BIKE':2, 'AUTO':1}
-        rating = (
-            (len(orders)/(rating_period.days*24)) * rating_coefs[courier.courier_type]
-        )
 
-        # расчет заработка
-        earnings_coefs = {'FOOT':2 , 'BIKE':3, 'AUTO':4}
-        earnings = sum(
-            [order.cost * earnings_coefs[courier.courier_type] 
-             for order in orders]
-        )        
+        # количество и стоимость выполненных заказов берутся из дневной статистики
+        completed_orders, orders_cost = completed_stats(
+            [courier.pk], start_date.date(), end_date.date()
+            )[courier.pk]
 
         response_data = {
-            'content': {
-                'courier_id': courier.id,
-                'courier_type':courier.courier_type,
-                'regions':courier.regions,
-                'working_hours':courier.working_hours
-            }
+            'content': self.meta_info(courier, completed_orders, orders_cost, rating_period)
         }
 
-        if rating:
-            response_data['content']['rating'] = rating
+        return Response(response_data, status=status.HTTP_200_OK)
 
-        if earnings:
-            response_data['content']['earnings'] = earnings
+    @action(detail=False, methods=['GET'], url_path='meta-info')
+    def get_meta_info_batch(self, request):
+        # Рейтинг и заработок сразу для многих курьеров (?courier_id=1&courier_id=2)
+        # или для всех курьеров: один GROUP BY-запрос по дневной статистике на страницу
+        try:
+            start_date = datetime.datetime.strptime(request.query_params.get('startDate'), '%Y-%m-%d')
+            end_date = datetime.datetime.strptime(request.query_params.get('endDate'), '%Y-%m-%d')
+            courier_ids = [int(pk) for pk in request.query_params.getlist('courier_id')]
+        except (TypeError, ValueError):
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        rating_period = end_date - start_date
+        if rating_period.days <= 0:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(response_data, status=status.HTTP_200_OK)
+        couriers = Couriers.objects.order_by('id')
+        if courier_ids:
+            couriers = couriers.filter(pk__in=courier_ids)
+
+        paginator = MetaInfoPagination()
+        page = paginator.paginate_queryset(couriers, request, view=self)
+        stats = completed_stats([courier.pk for courier in page], start_date.date(), end_date.date())
+        data = [
+            self.meta_info(courier, *stats[courier.pk], rating_period)
+            for courier in page
+        ]
+        return paginator.get_paginated_response(data)
     
+    @staticmethod
+    def assigned_orders(assignment_date, courier_id, limit, after):
+        orders = Orders.objects.filter(assignment_date=assignment_date, courier__isnull=False)
+
+        if courier_id is not None:
+            orders = orders.filter(courier_id=courier_id)
+        if after:
+            orders = orders.filter(courier_id__gt=after)
+
+        orders = orders.order_by('courier_id', 'id').values_list(
+            'courier_id', 'id', 'weight', 'regions', 'delivery_hours', 'cost'
+        ).iterator(chunk_size=settings.ASSIGNMENTS_CHUNK_SIZE)
+
+        response_couriers = []
+        orders_amount = 0
+        next_after = None
+        for courier_id, courier_orders in groupby(orders, key=itemgetter(0)):
+            if response_couriers and (len(response_couriers) == limit 
+                                      or orders_amount >= settings.ASSIGNMENTS_MAX_ORDERS):
+                next_after = response_couriers[-1]['courier_id']
+                break
+
+            courier_orders = [
+                {
+                    'order_id': pk,
+                    'weight': weight,
+                    'regions': regions,
+                    'delivery_hours': delivery_hours,
+                    'cost': cost
+                } 
+                for _, pk, weight, regions, delivery_hours, cost in courier_orders
+            ]
+            orders_amount += len(courier_orders)
+
+            response_couriers.append(
+            {'courier_id': courier_id,
+            'orders': {
+                'group_order_id': 1,
+                'orders': courier_orders
+                }}
+            )
+        
+        assignment_date = datetime.datetime.strftime(assignment_date, '%Y-%m-%d')
+        content = {
+            'date': assignment_date,
+            'couriers': response_couriers
+        }
+        if next_after is not None:
+            content['next'] = next_after
+        return content
+
     @action(detail=True, methods=['GET'], url_path='assignments')
     def get_assigned_orders(self, request):
         try:
             assignment_date = datetime.datetime.strptime(request.query_params['date'], '%Y-%m-%d').date()
+            explicit_date = True
         except:
             assignment_date = datetime.date.today()
+            explicit_date = False
         
-        response_couriers = []
+        # Страницы по курьерам: ?limit= - количество курьеров, ?after= - id последнего курьера
+        # предыдущей страницы. Ответ ограничен ASSIGNMENTS_MAX_ORDERS заказами (курьер 
+        # не разбивается между страницами); если данные не поместились, в ответе есть 'next'
+        try:
+            limit = int(request.query_params.get('limit', 0)) or None
+            after = int(request.query_params.get('after', 0))
+        except ValueError:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        if (limit or 0) < 0:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            couriers = [Couriers.objects.get(pk=request.query_params['courier_id'])]
+            courier_id = int(request.query_params['courier_id'])
         except:
-            couriers = Couriers.objects.all()
-        
-        for courier in couriers:
-
-            courier_orders = [
-                {
-                    'order_id': order.pk,
-                    'weight': order.weight,
-                    'regions': order.regions,
-                    'delivery_hours': order.delivery_hours,
-                    'cost': order.cost
-                } 
-                for order in courier.orders.all().filter(assignment_date=assignment_date)
-            ]
+            courier_id = None
+
+        # Ответ по одному курьеру помечается ETag / Last-Modified по версии его назначений:
+        # на If-None-Match / If-Modified-Since с той же версией - 304 после одного запроса версии.
+        # ETag включает дату и параметры страницы - от них тоже зависит тело ответа.
+        # Last-Modified отдаётся только с явной ?date=: без неё дата (сегодня) меняется
+        # в полночь без изменения версии
+        version = None
+        if courier_id is not None:
+            version = Couriers.objects.filter(pk=courier_id).values_list(
+                'assignment_version', 'assignments_updated_at'
+            ).first()
+            if version is None:
+                # неизвестный курьер - отдаются назначения всех курьеров
+                courier_id = None
+
+        headers = {}
+        if version is not None:
+            assignment_version, updated_at = version
+            headers['ETag'] = f'"{courier_id}-{assignment_version}-{assignment_date}-{limit or 0}-{after}"'
+            last_modified = int(updated_at.timestamp()) if updated_at and explicit_date else None
+            if last_modified is not None:
+                headers['Last-Modified'] = http_date(last_modified)
+
+            not_modified = get_conditional_response(request, etag=headers['ETag'], last_modified=last_modified)
+            if not_modified is not None:
+                for header, value in headers.items():
+                    not_modified[header] = value
+                return not_modified
 
-            if courier_orders:
-                response_couriers.append(
-                {'courier_id': courier.pk,
-                'orders': {
-                    'group_order_id': 1,
-                    'orders': courier_orders
-                    }}
-                )
-        
-        assignment_date = datetime.datetime.strftime(assignment_date, '%Y-%m-%d')
         response_data = {
-            'content': {
-                'date': assignment_date,
-                'couriers': sorted(response_couriers, key = lambda x: x['courier_id'])
-            }
+            'content': cached(assignments_key(assignment_date, courier_id, limit, after),
+                              lambda: self.assigned_orders(assignment_date, courier_id, limit, after))
         }
 
-        return Response(response_data, status=status.HTTP_200_OK) 
+        return Response(response_data, status=status.HTTP_200_OK, headers=headers) 
 
 
 class OrdersViewSet(StoreViewSet):
     queryset = Orders.objects.all()
     serializer_class = OrdersSerializer
+    read_serializer = ORDERS_READ
     pagination_class = OrdersPagination
+    content_field = 'orders'
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         serializer = OrdersSerializer(data=request.data['content']['orders'], many=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            self.on_saved(serializer.save())
 
         response_data = {
             'content': serializer.data
@@ -170,26 +437,35 @@ class OrdersViewSet(StoreViewSet):
 
         return Response(response_data, status=status.HTTP_200_OK)
     
+    def on_saved(self, objects):
+        queue_new_orders([order.pk for order in objects])
+
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        return Response({'content': serializer.data})
+        content = cached(order_key(kwargs['pk']), lambda: dict(self.get_serializer(self.get_object()).data))
+        return Response({'content': content})
 
     @action(detail=False, methods=['POST'], url_path='complete')
+    @idempotent
     def complete_order(self, request):
         serializer = CompleteOrderSerializer(data=request.data['content']['complete_info'], 
                                              partial=True, many=True)
 
-        if serializer.is_valid():
-            data = serializer.validated_data
-            response_data = []
-
-            for order_dict in data:
-                order = Orders.objects.get(pk=order_dict['order_id'])
-
-                if order.courier.pk == order_dict['courier_id']:
+        with transaction.atomic():
+            if serializer.is_valid():
+                data = serializer.validated_data
+                response_data = []
+                completed_orders = {}
+                released_orders = {}
+                stats_deltas = {}
+
+                for order_dict in data:
+                    # заказ заблокирован при проверке: complete_time - уже закоммиченное значение
+                    order = order_dict['order']
+                    if order.complete_time is None:
+                        released_orders[order.pk] = order
+                    add_completion(stats_deltas, order, order_dict['complete_time'])
                     order.complete_time = order_dict['complete_time']
-                    order.save()
+                    completed_orders[order.pk] = order
 
                     response_data.append({
                         'id':order.id,
@@ -200,75 +476,21 @@ class OrdersViewSet(StoreViewSet):
                         'complete_time':order.complete_time
                     })
 
-            return Response(response_data, status=status.HTTP_200_OK)
+                # заказы, которые до этого не были выполнены, освобождают место у курьера
+                couriers = lock_couriers({order.courier_id for order in released_orders.values()})
+                for order in released_orders.values():
+                    release_order(couriers[order.courier_id], order.weight, order.regions)
+                for courier in couriers.values():
+                    touch_assignments(courier)
+                Couriers.objects.bulk_update(couriers.values(), CAPACITY_FIELDS + VERSION_FIELDS)
 
-        return Response(status=status.HTTP_400_BAD_REQUEST)
-    
-    @staticmethod
-    def overlap(working_hours, delivery_hours, limit):
-        for delivery_interval in delivery_hours:
-            for working_interval in working_hours:
-                if working_interval[0] <= delivery_interval[0] <= delivery_interval[1] <= working_interval[1]:
-                    return True
-                elif working_interval[0] <= delivery_interval[0] <= working_interval[1] \
-                    and (working_interval[1]-delivery_interval[0]).seconds / 60 >= limit:
-                    return True
-                elif delivery_interval[0] <= working_interval[0] <= delivery_interval[1] \
-                    and (delivery_interval[1]-working_interval[0]).seconds / 60 >= limit:
-                    return True
-                elif delivery_interval[0] <= working_interval[1] <= delivery_interval[1] \
-                    and (delivery_interval[1]-working_interval[1]).seconds / 60 >= limit:
-                    return True
-        return False
-    
-    @staticmethod
-    def save_assigned_order(order, courier, assignment_date, coefficient, 
-                            pending_assigned_orders, now_assigned_orders):
-        order.courier = courier
-        order.assignment_date = assignment_date
-        order.cost = int(order.cost * coefficient)
-        order.save()
-        courier.orders.add(order)
-        pending_assigned_orders.append(order)
-        now_assigned_orders.append(
-            {
-                'order_id': order.pk,
-                'weight': order.weight,
-                'regions': order.regions,
-                'delivery_hours': order.delivery_hours,
-                'cost': order.cost
-            } 
-        )
-        return now_assigned_orders
+                Orders.objects.bulk_update(completed_orders.values(), ['complete_time'])
+                apply_deltas(stats_deltas)
 
-    def get_limit(self,  max_orders_amount, max_carriable_weight, max_regions_amount,
-                            first_order_in_region_time, subsequent_orders_in_region_time,
-                            order, courier, pending_assigned_orders):
-        
-        # Проверяет, может ли курьер взять ещё один заказ по лимиту 
-        # на количество заказов, суммарный вес заказов и количество регионов для типа этого курьера
-        if len(pending_assigned_orders) < max_orders_amount \
-            and (sum([order.weight for order in pending_assigned_orders]) + order.weight) <= max_carriable_weight \
-                and order.regions in courier.regions:
-            
-            pending_assigned_orders_regions = {o.regions for o in pending_assigned_orders}
-            regions_amount = len(pending_assigned_orders_regions | {order.regions}) 
-            if regions_amount <= max_regions_amount:
-                
-                # Считает количество суммарное времени, которое курьеру понадобится на выполнение 
-                # имеющихся заказов плюс этого заказа
-                if order.regions not in pending_assigned_orders_regions:
-                    limit = regions_amount * first_order_in_region_time + (len(pending_assigned_orders) - regions_amount + 1) \
-                        * subsequent_orders_in_region_time
-                    coefficient = 1
-                else:
-                    limit = regions_amount * first_order_in_region_time + (len(pending_assigned_orders) - regions_amount) \
-                        * subsequent_orders_in_region_time
-                    coefficient = 0.8
-
-                return limit, coefficient
-        return False, None
+                return Response(response_data, status=status.HTTP_200_OK)
 
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+    
     @action(detail=False, methods=['POST'], url_path='assign')
     def assign_orders(self, request):
         try:
@@ -276,109 +498,46 @@ class OrdersViewSet(StoreViewSet):
         except:
             assignment_date = datetime.datetime.strftime(datetime.datetime.now(), '%Y-%m-%d')
 
-        orders = list(Orders.objects.filter(complete_time__isnull=True, courier__isnull=True))
-
-        # Создаём из каждого из интервалов типа '10:00-11:00' список из двух datetime-объектов
-        # пример: [datetime.datetime(2023, 5, 10, 10, 0), datetime.datetime(2023, 5, 10, 11, 0)]
-        delivery_hours = [[
-            [datetime.datetime.strptime(f'{assignment_date} {subinterval}', '%Y-%m-%d %H:%M') 
-             for subinterval in interval.split('-')] 
-             for interval in order.delivery_hours] 
-             for order in orders
-            ]
-        
-        # в delivery_hours[0] лежит orders[0].delivery_hours
-        # => можно отсортировать список orders по списку delivery_hours
-        # теперь в начале списка orders будут лежать заказы с самыми ранними значениями поля delivery_hours
-        orders = sorted(orders, key=lambda order: delivery_hours[orders.index(order)])
-
-        # повторно сортируем delivery_hours, чтобы delivery_hours[0] снова был равен orders[0].delivery_hours
-        delivery_hours = sorted(delivery_hours)
-
-        # возвращаем пеших курьеров, у которых меньше 2х недоставленных заказов
-        couriers_foot = list(Couriers.objects.filter(
-            courier_type='FOOT', 
-            orders__complete_time__isnull=True
-            ).annotate(num_pending_orders=Count('orders', filter=Q(orders__complete_time__isnull=True))
-                       ).filter(num_pending_orders__lt=2))
-
-        # возвращаем велокурьеров, у которых меньше 4х недоставленных заказов
-        couries_bike = list(Couriers.objects.filter(
-            courier_type='BIKE', 
-            orders__complete_time__isnull=True
-            ).annotate(num_pending_orders=Count('orders', filter=Q(orders__complete_time__isnull=True))
-                       ).filter(num_pending_orders__lt=4))
-
-        # возвращаем автокурьеров, у которых меньше 7 недоставленных заказов
-        couriers_auto = list(Couriers.objects.filter(
-            courier_type='AUTO', 
-            orders__complete_time__isnull=True
-            ).annotate(num_pending_orders=Count('orders', filter=Q(orders__complete_time__isnull=True))
-                       ).filter(num_pending_orders__lt=7))
-        
-        couriers = couriers_foot + couries_bike + couriers_auto
-
-        response_couriers = []
-
-        for courier in couriers:
-            pending_assigned_orders = list(courier.orders.filter(complete_time__isnull=True))
-            now_assigned_orders = []
-            working_hours = [
-                [datetime.datetime.strptime(f'{assignment_date} {subinterval}', '%Y-%m-%d %H:%M') 
-                    for subinterval in interval.split('-')] 
-                for interval in courier.working_hours
-            ]
-
-            for order in orders:
-                if order.courier == None: 
-
-                    if courier.courier_type == 'FOOT':
-                        limit, coefficient = self.get_limit(max_orders_amount=2, max_carriable_weight=10, max_regions_amount=1,
-                            first_order_in_region_time=25, subsequent_orders_in_region_time=10,
-                            order=order, courier=courier, pending_assigned_orders=pending_assigned_orders)
-                        
-                        if limit:
-                            if self.overlap(working_hours, delivery_hours[orders.index(order)], limit):
-                                self.save_assigned_order(order, courier, assignment_date, coefficient, 
-                                                         pending_assigned_orders, now_assigned_orders)
-                
-                    elif courier.courier_type == 'BIKE':
-                        limit, coefficient = self.get_limit(max_orders_amount=4, max_carriable_weight=20, max_regions_amount=2,
-                            first_order_in_region_time=12, subsequent_orders_in_region_time=8,
-                            order=order, courier=courier, pending_assigned_orders=pending_assigned_orders)
-                        
-                        if limit:
-                            if self.overlap(working_hours, delivery_hours[orders.index(order)], limit):
-                                self.save_assigned_order(order, courier, assignment_date, coefficient, 
-                                                         pending_assigned_orders, now_assigned_orders)
-
-                    elif courier.courier_type == 'AUTO':
-                        limit, coefficient = self.get_limit(max_orders_amount=7, max_carriable_weight=40, max_regions_amount=4,
-                            first_order_in_region_time=8, subsequent_orders_in_region_time=4,
-                            order=order, courier=courier, pending_assigned_orders=pending_assigned_orders)
-                        
-                        if limit:
-                            if self.overlap(working_hours, delivery_hours[orders.index(order)], limit):
-                                self.save_assigned_order(order, courier, assignment_date, coefficient, 
-                                                         pending_assigned_orders, now_assigned_orders)
-
-            if now_assigned_orders:
-                response_couriers.append(
-                {'courier_id': courier.pk,
-                'orders': {
-                    'group_order_id': 1,
-                    'orders': now_assigned_orders
-                    }}
-                )
-
-        if type(assignment_date) == datetime.datetime:
-            assignment_date = datetime.datetime.strftime(assignment_date, '%Y-%m-%d')
+        # ?regions=1&regions=2 - распределить только заказы этих регионов, 
+        # ?batch_size - захватывать заказы пачками (см. run_assignment)
+        try:
+            regions = sorted({int(region) for region in request.query_params.getlist('regions')}) or None
+            batch_size = request.query_params.get('batch_size', settings.ASSIGNMENT_CLAIM_BATCH_SIZE)
+            batch_size = int(batch_size) if batch_size else None
+        except (TypeError, ValueError):
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        if batch_size is not None and batch_size <= 0:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        incremental = request.query_params.get('incremental') in ('1', 'true')
+
+        # ?async=1: распределение ставится в очередь и выполняется командой run_assignment_jobs
+        # с теми же regions и batch_size, ответ 202 с номером задачи, статус - GET /orders/assign/<job_id>/.
+        # Если за дату уже идёт распределение с другими параметрами - 409 с его статусом
+        if request.query_params.get('async') in ('1', 'true'):
+            if incremental:
+                return Response(status=status.HTTP_400_BAD_REQUEST)
+            job = enqueue_assignment(assignment_date, regions, batch_size)
+            if not same_params(job, regions, batch_size):
+                return Response({'content': job_status(job)}, status=status.HTTP_409_CONFLICT)
+            return Response({'content': job_status(job)}, status=status.HTTP_202_ACCEPTED)
+
+        # ?incremental=1: только заказы, созданные после прошлого инкрементального распределения
+        if incremental:
+            content = run_incremental_assignment(assignment_date)
+        else:
+            content = run_assignment(assignment_date, regions=regions, batch_size=batch_size)
 
         response_data = {
-            'content': {
-                'date': assignment_date,
-                'couriers': sorted(response_couriers, key = lambda x: x['courier_id'])
-            }
+            'content': content
         }
 
-        return Response(response_data, status=status.HTTP_201_CREATED) 
\ No newline at end of file
+        return Response(response_data, status=status.HTTP_201_CREATED) 
+
+    @action(detail=False, methods=['GET'], url_path='assign/<int:job_id>')
+    def get_assignment_job(self, request, job_id):
+        try:
+            job = AssignmentJob.objects.get(pk=job_id)
+        except AssignmentJob.DoesNotExist:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        return Response({'content': job_status(job)}, status=status.HTTP_200_OK)
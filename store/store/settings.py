@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,11 +45,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.routers.ReplicaMiddleware',
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -108,11 +112,32 @@ DATABASES = {
         'NAME': 'postgres',
         'USER': 'postgres',
         'PASSWORD': 'postgres',
-        'HOST': 'db',
-        'PORT': '5432',
+        'HOST': os.environ.get('DB_HOST', 'db'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        # постоянные соединения (секунды, 0 - новое соединение на каждый запрос)
+        # с проверкой перед повторным использованием
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        # за пулом pgbouncer в режиме transaction серверные курсоры (iterator) не работают
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_PGBOUNCER') == '1',
     }
 }
 
+# Реплики для чтения (api/routers.py): DB_REPLICAS=host:port,host:port.
+# Например, две локальные базы: DB_HOST=localhost DB_PORT=5432 DB_REPLICAS=localhost:5433.
+# В тестах реплики - зеркала основной базы
+DATABASE_REPLICAS = []
+for number, address in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), 1):
+    host, _, port = address.strip().partition(':')
+    DATABASES[f'replica{number}'] = dict(
+        DATABASES['default'], HOST=host, PORT=port or '5432', TEST={'MIRROR': 'default'}
+    )
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['api.routers.ReplicaRouter']
+# сколько секунд после изменяющего запроса клиент читает с основной базы
+REPLICA_PIN_SECONDS = 5
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -158,6 +183,10 @@ from django.core.management.commands.runserver import Command as runserver
 runserver.default_port = "8080"
 
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_THROTTLE_CLASSES': [
         'rest_framework.throttling.UserRateThrottle',
         'rest_framework.throttling.AnonRateThrottle',
@@ -166,4 +195,78 @@ REST_FRAMEWORK = {
         'user': '10/second',
         'anon': '10/second',
     }
-}
\ No newline at end of file
+}
+
+# Размер пачки при записи результатов распределения заказов
+ASSIGNMENT_BATCH_SIZE = 1000
+
+# Размер пачки для валидации и bulk_create в POST /couriers/bulk и /orders/bulk
+BULK_INGEST_BATCH_SIZE = 1000
+
+# GET /couriers/assignments: максимум заказов в одном ответе 
+# и размер пачки при чтении заказов из БД
+ASSIGNMENTS_MAX_ORDERS = 10000
+ASSIGNMENTS_CHUNK_SIZE = 2000
+
+# Выгрузка /couriers/export/, /orders/export/ и команда export_data: 
+# строк на одно чтение серверного курсора и на одну часть ответа
+EXPORT_CHUNK_SIZE = 2000
+
+# Количество процессов для распределения заказов: независимые группы регионов
+# распределяются параллельно, 1 - без дополнительных процессов
+ASSIGNMENT_WORKERS = 1
+
+# POST /orders/assign: сколько нераспределённых заказов захватывать (FOR UPDATE SKIP LOCKED)
+# и распределять в одной транзакции, None - все сразу
+ASSIGNMENT_CLAIM_BATCH_SIZE = None
+
+# Фоновое распределение (api/jobs.py): обработчик отмечается в задаче раз в четверть этого
+# времени, задача без отметки дольше него считается брошенной и помечается failed
+ASSIGNMENT_JOB_LEASE_SECONDS = 60
+
+# Кэш ответов API (api/cache.py): LocMemCache вытесняет давно не использованные записи
+# сверх MAX_ENTRIES. Для нескольких процессов - общий бэкенд, например
+# 'django.core.cache.backends.filebased.FileBasedCache' с LOCATION '/var/tmp/store_cache'
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'store-api',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+API_CACHE_ALIAS = 'api'
+
+# Метрики запросов (api/metrics.py, GET /metrics): запросы не быстрее METRICS_SLOW_REQUEST_SECONDS
+# или не меньше чем с METRICS_SLOW_REQUEST_QUERIES SQL-запросами пишутся в лог 
+# с самым медленным запросом, None - не писать
+METRICS_SLOW_REQUEST_SECONDS = 1.0
+METRICS_SLOW_REQUEST_QUERIES = 100
+
+# Профилирование запросов сотрудников по заголовку X-Profile: 1 (api/profiling.py):
+# каталог для .prof / .folded, сколько последних профилей хранить и интервал опроса стека
+PROFILING_ENABLED = False
+PROFILING_DIR = BASE_DIR / 'profiles'
+PROFILING_MAX_FILES = 50
+PROFILING_SAMPLE_INTERVAL = 0.005
+
+# Сериализация JSON в api.renderers.FastJSONRenderer: 'json' (стандартная библиотека)
+# или 'orjson' (быстрее, если установлен; отличия вывода - в api/renderers.py)
+API_JSON_BACKEND = 'json'
+
+# Секции таблицы заказов по месяцам (api/partitions.py, команда maintain_order_partitions):
+# на сколько месяцев вперёд создавать секции и через сколько месяцев после окончания месяца
+# переносить его выполненные заказы в архив, None - не архивировать
+ORDER_PARTITIONS_AHEAD = 3
+ORDER_ARCHIVE_AFTER_MONTHS = None
+
+# Идемпотентные POST (api/idempotency.py, заголовок Idempotency-Key): сколько секунд хранится
+# ответ (устаревшие ключи удаляет purge_idempotency_keys) и через сколько секунд без отметки
+# выполняющегося запроса (упавший процесс) его ключ может занять повторный запрос
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+IDEMPOTENCY_PROCESSING_TIMEOUT = 60
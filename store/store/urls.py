@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from api.metrics import metrics
 from api.views import CouriersViewSet, OrdersViewSet
 
 router = DefaultRouter()
@@ -10,13 +11,26 @@ router.register(r'orders', OrdersViewSet)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics),
+    path('couriers/meta-info/',
+         CouriersViewSet.as_view({'get': 'get_meta_info_batch'})),
     path('couriers/meta-info/<int:courier_id>/',
          CouriersViewSet.as_view({'get': 'get_meta_info'})),
+    path('couriers/bulk/',
+         CouriersViewSet.as_view({'post': 'bulk_ingest'})),
+    path('couriers/export/',
+         CouriersViewSet.as_view({'get': 'export'})),
     path('couriers/assignments/',
          CouriersViewSet.as_view({'get': 'get_assigned_orders'})),
     path('orders/complete/',
          OrdersViewSet.as_view({'post': 'complete_order'})),
+    path('orders/bulk/',
+         OrdersViewSet.as_view({'post': 'bulk_ingest'})),
+    path('orders/export/',
+         OrdersViewSet.as_view({'get': 'export'})),
     path('orders/assign/',
          OrdersViewSet.as_view({'post': 'assign_orders'})),
+    path('orders/assign/<int:job_id>/',
+         OrdersViewSet.as_view({'get': 'get_assignment_job'})),
     path('', include(router.urls))
 ]